@@ -1,13 +1,19 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
 from flask_migrate import Migrate 
-import pandas as pd
-from prophet import Prophet
+import click
+import io
+import json
 import logging
+import multiprocessing
+import threading
+import time
 from datetime import datetime
 from datetime import timedelta
+from sqlalchemy import insert, text
+from sqlalchemy.orm import joinedload
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,18 +23,33 @@ logging.basicConfig(
 
 from config import Config
 from models import db, Expense, User, Budget
-from auth import auth_bp
+from auth import auth_bp, current_user_id
 from utils import *
+from rollup import (
+    category_totals, month_total, rebuild_rollup, record_expense, record_expense_frame, remove_expenses
+)
+from outbox import deliver_pending, enqueue, prune_delivered
+from settlements import group_balances, invalidate_group
+from forecast import (
+    ForecastQueueFull, daily_expense_series, expense_fingerprint, fit_forecast,
+    forecast_cache, forecast_jobs
+)
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from scheduler import build_scheduler
+from lazy import LazyResource, resources, warm_up
+from cache import expense_versions
 from datetime import datetime
 from models import *
 from flask_mail import Mail, Message
 import os
 from dotenv import load_dotenv
-from chatbot.chatbot import FinanceChatBot
 
-finance_bot = FinanceChatBot()
+def load_chatbot():
+    from chatbot.chatbot import FinanceChatBot
+    return FinanceChatBot()
+
+# Heavy components are built on first use (or by warm_up_app), not at import
+finance_bot = LazyResource("chatbot", load_chatbot)
 
 load_dotenv()
 
@@ -43,22 +64,22 @@ JWTManager(app)
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=120)
 app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=30)
 
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
 app.config['MAIL_USERNAME'] = MAIL_USERNAME
 app.config['MAIL_PASSWORD'] = MAIL_PASSWORD  # Use app password, not raw password
 
 mail = Mail(app)
+forecast_jobs.init_app(app)
 
 migrate = Migrate(app, db)
 
 # Register blueprint
 app.register_blueprint(auth_bp)
 
-# Load model once at startup
-categorizer_model = load_model()
-vectorizer = load_vectorizer()
+# Category model and vectorizer, loaded once on first use
+categorizer = LazyResource("categorizer", lambda: (load_model(), load_vectorizer()))
 
 # @app.before_request 
 # def create_tables():
@@ -68,37 +89,28 @@ vectorizer = load_vectorizer()
 @jwt_required()
 def predict():
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
+        user_id = current_user_id()
 
-        if not user:
+        if not user_id:
             return jsonify({'status': 'error', 'message': 'User not found'}), 404
 
-        expenses = Expense.query.filter_by(user_id=user.id).all()
-        if not expenses:
+        fingerprint = expense_fingerprint(user_id)
+        if not fingerprint[0]:
             return jsonify({'status': 'error', 'message': 'No data available for forecasting'}), 400
 
-        # Create DataFrame
-        df = pd.DataFrame([{
-            'ds': e.ds.strftime('%Y-%m-%d'),
-            'y': e.amount
-        } for e in expenses])
-
-
+        # Reuse the last fit while the user's expenses are unchanged
+        forecast_json = forecast_cache.get(user_id, fingerprint)
+        if forecast_json is not None:
+            return jsonify({'status': 'success', 'forecast': forecast_json})
 
+        # One row per day, aggregated in the database
+        df = daily_expense_series(user_id)
         if df.empty:
             return jsonify({'status': 'error', 'message': 'Not enough data to predict'}), 422
-        df['floor'] = 0
-
-        # Train model
-        model = Prophet()
-        model.fit(df)
 
-        # Forecast
-        future = model.make_future_dataframe(periods=30)
-        future['floor'] = 0
-        forecast = model.predict(future)
-        forecast_json = forecast[['ds', 'yhat']].to_dict(orient='records')
+        # Train model and forecast
+        forecast_json = fit_forecast(df)
+        forecast_cache.set(user_id, fingerprint, forecast_json)
 
         return jsonify({'status': 'success', 'forecast': forecast_json})
 
@@ -108,26 +120,155 @@ def predict():
 
 
 
+@app.route('/predict/jobs', methods=['POST'])
+@jwt_required()
+def create_predict_job():
+    try:
+        user_id = current_user_id()
+
+        if not user_id:
+            return jsonify({'status': 'error', 'message': 'User not found'}), 404
+
+        fingerprint = expense_fingerprint(user_id)
+        if not fingerprint[0]:
+            return jsonify({'status': 'error', 'message': 'No data available for forecasting'}), 400
+
+        # Nothing to queue if the current data has already been fitted, here or on another worker
+        forecast_json = forecast_cache.get(user_id, fingerprint)
+        if forecast_json is not None:
+            return jsonify({'status': 'success', 'state': 'done', 'forecast': forecast_json})
+
+        record = forecast_jobs.find(user_id, fingerprint)
+        if record is not None and record.state == 'done':
+            forecast_json = forecast_jobs.result(record)
+            forecast_cache.set(user_id, fingerprint, forecast_json)
+            return jsonify({'status': 'success', 'state': 'done', 'forecast': forecast_json})
+
+        if record is not None:
+            job_id = record.id  # already queued by some worker
+        else:
+            job_id = forecast_jobs.submit(user_id, fingerprint, daily_expense_series(user_id))
+
+        return jsonify({
+            'status': 'success',
+            'job_id': job_id,
+            'state': 'queued',
+            'queue_depth': forecast_jobs.queue_depth()
+        }), 202
+
+    except ForecastQueueFull:
+        return jsonify({'status': 'error', 'message': 'Forecast queue is full, try again shortly'}), 503
+    except Exception as e:
+        print("[ERROR] /predict/jobs failed:", e)
+        return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
+
+
+@app.route('/predict/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_predict_job(job_id):
+    try:
+        user_id = current_user_id()
+
+        record = db.session.get(ForecastResult, job_id)
+        if not user_id or not record or record.user_id != user_id:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+        # Optional long-poll, ?wait=<seconds>, when the job runs on this worker.
+        # It holds a request thread, so the Procfile runs threaded workers.
+        job = forecast_jobs.get(job_id)
+        wait = min(request.args.get('wait', 0, type=float), 30)
+        if job is not None:
+            state = job.wait(wait) if wait > 0 else job.state
+            if state == 'done':
+                forecast_json = job.future.result()
+        else:
+            state = 'failed' if forecast_jobs.is_stale(record) else record.state
+            if state == 'done':
+                forecast_json = forecast_jobs.result(record)
+
+        result = {'status': 'success', 'job_id': job_id, 'state': state}
+        if state == 'done':
+            result['forecast'] = forecast_json
+        elif state == 'failed':
+            result['message'] = 'Forecast failed'
+        else:
+            result['queue_depth'] = forecast_jobs.queue_depth()
+
+        return jsonify(result)
+
+    except Exception as e:
+        print("[ERROR] /predict/jobs GET failed:", e)
+        return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
+
+
+MAX_PAGE_SIZE = 1000
+DEFAULT_AUDIT_PAGE_SIZE = 100
+
+def parse_date_arg(value):
+    return datetime.fromisoformat(value) if value else None
+
+def parse_end_arg(value):
+    """Like parse_date_arg, but a bare YYYY-MM-DD stays a date so the filter takes in that whole day."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed.date() if len(value) == 10 else parsed
+
+def list_expenses(user_id, serialize, key):
+    """Shared listing for /historical and /get-expenses.
+
+    Query args: limit, after (cursor from next_cursor), start, end and
+    format=ndjson. Without limit every row is returned, as before.
+    """
+    args = request.args
+    limit = args.get('limit', type=int)
+    query = expense_page_query(
+        user_id,
+        after=args.get('after'),
+        start=parse_date_arg(args.get('start')),
+        end=parse_end_arg(args.get('end'))
+    )
+
+    if args.get('format') == 'ndjson':
+        if limit:
+            query = query.limit(limit)
+
+        def generate():
+            for row in query.yield_per(500):
+                yield json.dumps(serialize(row)) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    if limit is None:
+        return jsonify({'status': 'success', key: [serialize(row) for row in query.all()]})
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].ds, rows[-1].id)
+
+    return jsonify({'status': 'success', key: [serialize(row) for row in rows], 'next_cursor': next_cursor})
+
+
 @app.route('/historical', methods=['GET'])
 @jwt_required()
 def historical():
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
-
-        expenses = Expense.query.filter_by(user_id=user.id).all()
-        historical_json = [
-            {
-                'id': e.id,
-                'ds': e.ds.isoformat(),
-                'amount': e.amount,
-                'category': e.category,
-                'description': e.description,
-                'is_recurring': e.is_recurring,
-                'recurring_interval': e.recurring_interval
-            } for e in expenses
-        ]
-        return jsonify({'status': 'success', 'historical': historical_json})
+        user_id = current_user_id()
+
+        return list_expenses(user_id, lambda e: {
+            'id': e.id,
+            'ds': e.ds.isoformat(),
+            'amount': e.amount,
+            'category': e.category,
+            'description': e.description,
+            'is_recurring': e.is_recurring,
+            'recurring_interval': e.recurring_interval
+        }, 'historical')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid query parameter: {e}'}), 400
     except Exception as e:
         print("[ERROR] /historical failed:", e)
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -137,17 +278,17 @@ def historical():
 @jwt_required()
 def predict_category():
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
+        user_id = current_user_id()
         data = request.get_json()
         description = data.get('description', '')
 
         if not description:
             return jsonify({'status': 'error', 'message': 'Description is required'}), 400
 
+        categorizer_model, vectorizer = categorizer.get()
         X_test = vectorizer.transform([description])
         prediction = categorizer_model.predict(X_test)[0]
-        category = apply_rules(user_id=user.id, description=description)
+        category = apply_rules(user_id=user_id, description=description)
 
         return jsonify({'status': 'success', 'category': category if category else prediction})
 
@@ -155,13 +296,44 @@ def predict_category():
         print("[ERROR] /predict-category failed:", e)
         return jsonify({'status': 'error', 'message': str(e)}), 500
     
+MAX_BATCH_DESCRIPTIONS = 1000
+
+@app.route('/predict-category/batch', methods=['POST'])
+@jwt_required()
+def predict_category_batch():
+    try:
+        user_id = current_user_id()
+        data = request.get_json() or {}
+        descriptions = data.get('descriptions')
+
+        if not isinstance(descriptions, list) or not descriptions:
+            return jsonify({'status': 'error', 'message': 'A list of descriptions is required'}), 400
+        if len(descriptions) > MAX_BATCH_DESCRIPTIONS:
+            return jsonify({'status': 'error', 'message': f'At most {MAX_BATCH_DESCRIPTIONS} descriptions per request'}), 400
+
+        descriptions = [str(d or '') for d in descriptions]
+
+        # One sparse-matrix transform and one predict call for the whole batch
+        categorizer_model, vectorizer = categorizer.get()
+        predictions = categorizer_model.predict(vectorizer.transform(descriptions))
+        rule_categories = apply_rules_batch(user_id=user_id, descriptions=descriptions)
+
+        categories = [
+            rule_category if rule_category else str(prediction)
+            for rule_category, prediction in zip(rule_categories, predictions)
+        ]
+        return jsonify({'status': 'success', 'categories': categories})
+
+    except Exception as e:
+        print("[ERROR] /predict-category/batch failed:", e)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 # Add Rule
 @app.route('/rules', methods=['POST'])
 @jwt_required()
 def add_rule():
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
+        user_id = current_user_id()
 
         data = request.get_json()
         keyword = data.get("keyword")
@@ -170,9 +342,10 @@ def add_rule():
         if not keyword or not category:
             return jsonify({"status": "error", "message": "Keyword and category are required"}), 400
 
-        new_rule = Rule(user_id=user.id, keyword=keyword, category=category)
+        new_rule = Rule(user_id=user_id, keyword=keyword, category=category)
         db.session.add(new_rule)
         db.session.commit()
+        invalidate_rules(user_id)
 
         return jsonify({"status": "success", "message": "Rule added successfully"})
 
@@ -186,10 +359,9 @@ def add_rule():
 @jwt_required()
 def get_rules():
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
+        user_id = current_user_id()
 
-        rules = Rule.query.filter_by(user_id=user.id).all()
+        rules = Rule.query.filter_by(user_id=user_id).all()
         rules_list = [{"id": r.id, "keyword": r.keyword, "category": r.category} for r in rules]
 
         return jsonify({"status": "success", "rules": rules_list})
@@ -204,15 +376,15 @@ def get_rules():
 @jwt_required()
 def delete_rule(rule_id):
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
+        user_id = current_user_id()
 
-        rule = Rule.query.filter_by(id=rule_id, user_id=user.id).first()
+        rule = Rule.query.filter_by(id=rule_id, user_id=user_id).first()
         if not rule:
             return jsonify({"status": "error", "message": "Rule not found"}), 404
 
         db.session.delete(rule)
         db.session.commit()
+        invalidate_rules(user_id)
 
         return jsonify({"status": "success", "message": "Rule deleted successfully"})
 
@@ -223,19 +395,25 @@ def delete_rule(rule_id):
 
 
 
+def expenses_changed(user_id, *group_ids):
+    """Drop the caches derived from a user's expenses, and from the groups they touched."""
+    forecast_cache.invalidate(user_id)
+    expense_versions.bump(user_id)
+    for group_id in group_ids:
+        invalidate_group(group_id)
+
 @app.route('/add-expense', methods=['POST'])
 @jwt_required()
 def add_expense():
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
+        user_id = current_user_id()
 
-        if not user:
+        if not user_id:
             return jsonify({'status': 'error', 'message': 'User not found'}), 404
 
         data = request.get_json()
         new_expense = Expense(
-            user_id=user.id,
+            user_id=user_id,
             ds=datetime.fromisoformat(data['ds']),
             amount=float(data['amount']),
             category=data.get('category', '').strip(),
@@ -245,9 +423,10 @@ def add_expense():
             group_id=data.get("group_id")
         )
         db.session.add(new_expense)
+        record_expense(new_expense)
+        log_expense_action(new_expense, user_id, 'created')
         db.session.commit()
-
-        log_expense_action(new_expense.id, user.id, 'created')
+        expenses_changed(user_id, new_expense.group_id)
 
         return jsonify({'status': 'success', 'message': 'Expense added.'})
     except Exception as e:
@@ -255,13 +434,119 @@ def add_expense():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+MAX_IMPORT_ROWS = 20000
+IMPORT_COLUMNS = ['ds', 'amount', 'category', 'description', 'is_recurring', 'recurring_interval', 'group_id']
+
+def read_import_frame():
+    """Parse the import body (CSV upload, CSV text or JSON array) into a clean DataFrame."""
+    import pandas as pd
+
+    if 'file' in request.files:
+        df = pd.read_csv(request.files['file'])
+    elif request.is_json:
+        df = pd.DataFrame(request.get_json())
+    else:
+        df = pd.read_csv(io.StringIO(request.get_data(as_text=True)))
+
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    if 'ds' not in df or 'amount' not in df:
+        raise ValueError("Columns 'ds' and 'amount' are required")
+    if len(df) > MAX_IMPORT_ROWS:
+        raise ValueError(f"At most {MAX_IMPORT_ROWS} rows per import")
+
+    df = df.reindex(columns=IMPORT_COLUMNS)
+    df['ds'] = pd.to_datetime(df['ds'], errors='coerce')
+    df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
+    bad_rows = df.index[df['ds'].isna() | df['amount'].isna()]
+    if len(bad_rows):
+        raise ValueError(f"Invalid ds or amount in rows {[int(i) for i in bad_rows[:10]]}")
+
+    df['category'] = df['category'].fillna('').astype(str).str.strip()
+    df['description'] = df['description'].fillna('').astype(str)
+    # A CSV column with blanks is read as float (1.0), so numbers count by value
+    recurring = df['is_recurring']
+    df['is_recurring'] = (
+        pd.to_numeric(recurring, errors='coerce').fillna(0).ne(0)
+        | recurring.astype(str).str.strip().str.lower().isin(['true', 'yes'])
+    )
+    df['recurring_interval'] = df['recurring_interval'].astype(object).where(df['recurring_interval'].notna(), None)
+    df['group_id'] = pd.to_numeric(df['group_id'], errors='coerce').astype('Int64')
+    return df
+
+
+@app.route('/expenses/import', methods=['POST'])
+@jwt_required()
+def import_expenses():
+    import pandas as pd
+
+    try:
+        user_id = current_user_id()
+        if not user_id:
+            return jsonify({'status': 'error', 'message': 'User not found'}), 404
+
+        try:
+            df = read_import_frame()
+        except (ValueError, pd.errors.ParserError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        if df.empty:
+            return jsonify({'status': 'error', 'message': 'No rows to import'}), 400
+
+        group_ids = set(df['group_id'].dropna().astype(int))
+        if group_ids:
+            member_of = {gid for (gid,) in db.session.query(GroupMembership.group_id).filter_by(user_id=user_id)}
+            if not group_ids <= member_of:
+                return jsonify({'status': 'error', 'message': 'Not a member of every group in the import'}), 403
+
+        # Fill missing categories: user rules first, then one batched model call
+        missing = df['category'] == ''
+        if missing.any():
+            descriptions = df.loc[missing, 'description'].tolist()
+            categorizer_model, vectorizer = categorizer.get()
+            predicted = categorizer_model.predict(vectorizer.transform(descriptions))
+            ruled = apply_rules_batch(user_id=user_id, descriptions=descriptions)
+            df.loc[missing, 'category'] = [r if r else str(p) for r, p in zip(ruled, predicted)]
+
+        rows = [{
+            'user_id': user_id,
+            'ds': ds.to_pydatetime(),
+            'amount': float(amount),
+            'category': category,
+            'description': description,
+            'is_recurring': bool(is_recurring),
+            'recurring_interval': recurring_interval,
+            'group_id': None if pd.isna(group_id) else int(group_id)
+        } for ds, amount, category, description, is_recurring, recurring_interval, group_id
+            in df[IMPORT_COLUMNS].itertuples(index=False)]
+
+        # Expenses, their audit rows and the rollup all go in one transaction
+        expense_ids = db.session.scalars(
+            insert(Expense).returning(Expense.id, sort_by_parameter_order=True), rows
+        ).all()
+        now = datetime.utcnow()
+        db.session.execute(insert(ExpenseAudit), [
+            {'expense_id': expense_id, 'user_id': user_id, 'action': 'created', 'timestamp': now,
+             'group_id': row['group_id'], 'amount': row['amount'], 'description': row['description'],
+             'expense_ds': row['ds']}
+            for expense_id, row in zip(expense_ids, rows)
+        ])
+        record_expense_frame(user_id, df)
+        db.session.commit()
+        expenses_changed(user_id, *group_ids)
+
+        return jsonify({'status': 'success', 'imported': len(expense_ids)})
+    except Exception as e:
+        db.session.rollback()
+        print("[ERROR] /expenses/import failed:", e)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 @app.route('/get-expenses', methods=['GET'])
 @jwt_required()
 def get_expenses():
     try:
-        user = get_jwt_identity()
-        expenses = Expense.query.filter_by(user_id=user).all()
-        data = [{
+        user_id = current_user_id()
+
+        return list_expenses(user_id, lambda exp: {
             'ds': exp.ds.strftime('%Y-%m-%d'),
             'amount': exp.amount,
             'category': exp.category,
@@ -269,8 +554,9 @@ def get_expenses():
             'is_recurring': exp.is_recurring,
             'recurring_interval': exp.recurring_interval
 
-        } for exp in expenses]
-        return jsonify({'status': 'success', 'expenses': data})
+        }, 'expenses')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid query parameter: {e}'}), 400
     except Exception as e:
         print("[ERROR] /get-expenses:", e)
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -279,8 +565,7 @@ def get_expenses():
 @jwt_required()
 def update_expense(id):
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
+        user_id = current_user_id()
         data = request.get_json()
 
         # Try fetching the expense
@@ -289,20 +574,23 @@ def update_expense(id):
             return jsonify({'status': 'error', 'message': 'Expense not found'}), 404
 
         # Check permission
-        if expense.user_id != user.id:
-            membership = GroupMembership.query.filter_by(user_id=user.id, group_id=expense.group_id).first()
+        if expense.user_id != user_id:
+            membership = GroupMembership.query.filter_by(user_id=user_id, group_id=expense.group_id).first()
             if not membership or membership.role != "admin":
                 return jsonify({'status': 'error', 'message': 'Not authorized to update this expense'}), 403
 
-        # Perform update
+        # Perform update, moving the expense between rollup buckets
+        record_expense(expense, sign=-1)
         expense.amount = float(data['amount'])
         expense.category = data.get('category', expense.category)
         expense.description = data.get('description', expense.description)
         expense.is_recurring = bool(data.get('is_recurring', expense.is_recurring))
         expense.recurring_interval = data.get('recurring_interval', expense.recurring_interval)
+        record_expense(expense)
+        log_expense_action(expense, user_id, 'updated')
 
         db.session.commit()
-        log_expense_action(expense.id, user.id, 'updated')
+        expenses_changed(expense.user_id, expense.group_id)
         return jsonify({'status': 'success', 'message': 'Expense updated.'})
 
     except Exception as e:
@@ -313,21 +601,24 @@ def update_expense(id):
 @jwt_required()
 def delete_expense(id):
     try:
-        current_user = get_jwt_identity()
-        user = User.query.filter_by(username=current_user).first()
+        user_id = current_user_id()
 
         expense = Expense.query.get(id)
         if not expense:
             return jsonify({'status': 'error', 'message': 'Expense not found'}), 404
 
         # Check permission
-        if expense.user_id != user.id:
-            membership = GroupMembership.query.filter_by(user_id=user.id, group_id=expense.group_id).first()
+        if expense.user_id != user_id:
+            membership = GroupMembership.query.filter_by(user_id=user_id, group_id=expense.group_id).first()
             if not membership or membership.role != "admin":
                 return jsonify({'status': 'error', 'message': 'Not authorized to delete this expense'}), 403
 
+        owner_id, group_id = expense.user_id, expense.group_id
+        record_expense(expense, sign=-1)
+        log_expense_action(expense, user_id, 'deleted')
         db.session.delete(expense)
         db.session.commit()
+        expenses_changed(owner_id, group_id)
         return jsonify({'status': 'success', 'message': 'Expense deleted.'})
 
     except Exception as e:
@@ -339,12 +630,10 @@ from sqlalchemy import extract, func
 @app.route("/suggestions", methods=["GET"])
 @jwt_required()
 def get_suggestions():
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
 
-    user_id = user.id
     now = datetime.utcnow()
     current_month, current_year = now.month, now.year
     
@@ -353,20 +642,9 @@ def get_suggestions():
     last_month_date = first_day_of_current_month - timedelta(days=1)
     last_month, last_month_year = last_month_date.month, last_month_date.year
 
-    # --- Utility for totals ---
-    def get_category_totals(month, year):
-        result = (
-            db.session.query(Expense.category, func.sum(Expense.amount))
-            .filter_by(user_id=user_id)
-            .filter(extract("month", Expense.ds) == month)
-            .filter(extract("year", Expense.ds) == year)
-            .group_by(Expense.category)
-            .all()
-        )
-        return {cat: float(amount) for cat, amount in result}
-
-    this_month = get_category_totals(current_month, current_year)
-    prev_month = get_category_totals(last_month, last_month_year)
+    # --- Totals from the monthly rollup ---
+    this_month = category_totals(user_id, current_year, current_month)
+    prev_month = category_totals(user_id, last_month_year, last_month)
 
     suggestions = []
     # Set to track categories that received a specific budget-based alert
@@ -441,14 +719,10 @@ def get_suggestions():
 @app.route("/api/groups", methods=["POST"])
 @jwt_required()
 def create_group():
-    username = get_jwt_identity()
-
-    # ✅ Get the actual user object
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
 
-    user_id = user.id
     data = request.json
     name = data.get("name")
 
@@ -468,27 +742,25 @@ def create_group():
 @app.route("/api/groups", methods=["GET"])
 @jwt_required()
 def get_user_groups():
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
 
-    user_id = user.id
-
-    memberships = GroupMembership.query.filter_by(user_id=user_id).all()
-    group_ids = [m.group_id for m in memberships]
-
-    groups = Group.query.filter(Group.id.in_(group_ids)).all()
-    # Map group_id to role for this user
-    group_roles = {m.group_id: m.role for m in memberships}
+    # Groups and this user's role in each, in one joined query
+    groups = (
+        db.session.query(Group.id, Group.name, GroupMembership.role)
+        .join(GroupMembership, GroupMembership.group_id == Group.id)
+        .filter(GroupMembership.user_id == user_id)
+        .all()
+    )
 
     result = [
         {
-            "id": g.id,
-            "name": g.name,
-            "role": group_roles.get(g.id, "member")
+            "id": group_id,
+            "name": name,
+            "role": role
         }
-        for g in groups
+        for group_id, name, role in groups
     ]
 
     return jsonify({"groups": result})
@@ -496,13 +768,12 @@ def get_user_groups():
 @app.route("/api/groups/<int:group_id>/invite", methods=["POST"])
 @jwt_required()
 def invite_user(group_id):
-    inviter_username = get_jwt_identity()
-    inviter = User.query.filter_by(username=inviter_username).first()
-    if not inviter:
+    inviter_id = current_user_id()
+    if not inviter_id:
         return jsonify({"error": "User not found"}), 404
 
     inviter_membership = GroupMembership.query.filter_by(
-        user_id=inviter.id, group_id=group_id
+        user_id=inviter_id, group_id=group_id
     ).first()
     if not inviter_membership or inviter_membership.role != "admin":
         return jsonify({"error": "Only admins can invite users."}), 403
@@ -522,18 +793,18 @@ def invite_user(group_id):
 
     db.session.add(GroupMembership(user_id=invitee.id, group_id=group_id))
     db.session.commit()
+    invalidate_group(group_id)
 
     return jsonify({"message": "User added to group"})
 
 @app.route("/api/groups/<int:group_id>/expenses", methods=["GET"])
 @jwt_required()
 def get_group_expenses(group_id):
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
 
-    membership = GroupMembership.query.filter_by(group_id=group_id, user_id=user.id).first()
+    membership = GroupMembership.query.filter_by(group_id=group_id, user_id=user_id).first()
     if not membership:
         return jsonify({"error": "Not authorized"}), 403
 
@@ -542,7 +813,7 @@ def get_group_expenses(group_id):
     result = []
     for e in expenses:
         is_authorised = (
-            e.user_id == user.id or membership.role == "admin"
+            e.user_id == user_id or membership.role == "admin"
         )
         result.append({
             "id": e.id,
@@ -562,43 +833,52 @@ def get_group_expenses(group_id):
 @app.route("/api/groups/<int:group_id>", methods=["DELETE"])
 @jwt_required()
 def delete_group(group_id):
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
 
     # Only allow deletion if user is the creator
-    group = Group.query.filter_by(id=group_id, created_by=user.id).first()
+    group = Group.query.filter_by(id=group_id, created_by=user_id).first()
     if not group:
         return jsonify({"error": "Group not found or not authorized"}), 404
 
     # Delete memberships first (to avoid foreign key constraint)
     GroupMembership.query.filter_by(group_id=group_id).delete()
     # Optionally, delete group expenses as well:
+    owner_ids = [uid for (uid,) in db.session.query(Expense.user_id).filter_by(group_id=group_id).distinct()]
+    remove_expenses(Expense.group_id == group_id)
     Expense.query.filter_by(group_id=group_id).delete()
     db.session.delete(group)
     db.session.commit()
+    invalidate_group(group_id)
+    for owner_id in owner_ids:
+        expenses_changed(owner_id)
     return jsonify({"message": "Group deleted"})
 
 @app.route('/api/group_users/<int:group_id>', methods=['GET'])
 @jwt_required()
 def get_group_users(group_id):
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({'error': 'User not found'}), 404
 
+    # All members with their users in one query; the membership check reuses it
+    members = (
+        GroupMembership.query
+        .options(joinedload(GroupMembership.user))
+        .filter_by(group_id=group_id)
+        .all()
+    )
+
     # Check if requesting user is in the group
-    membership = GroupMembership.query.filter_by(user_id=user.id, group_id=group_id).first()
-    if not membership:
+    if not any(m.user_id == user_id for m in members):
         return jsonify({'error': 'Unauthorized access to group'}), 403
 
-    members = GroupMembership.query.filter_by(group_id=group_id).all()
     users_data = [{
         'id': m.user.id,
         'username': m.user.username,
         'role': m.role,
-        'is_authorised_user': True if m.user.id == user.id or m.role == "admin" else False
+        'is_authorised_user': True if m.user.id == user_id or m.role == "admin" else False
     } for m in members]
 
     return jsonify({'users': users_data})
@@ -636,63 +916,54 @@ def remove_user(current_user):
 @app.route('/api/group/<int:group_id>/audit-log', methods=['GET'])
 @jwt_required()
 def get_audit_log(group_id):
-    logs = (
-        db.session.query(ExpenseAudit, User.username, Expense.ds, Expense.amount, Expense.description)
-        .join(User, ExpenseAudit.user_id == User.id)
-        .join(Expense, ExpenseAudit.expense_id == Expense.id)
-        .filter(Expense.group_id == group_id)
-        .order_by(ExpenseAudit.timestamp.desc())
-        .all()
-    )
+    """Newest entries first. Query args: limit, after (cursor from next_cursor), start, end."""
+    user_id = current_user_id()
+    if not GroupMembership.query.filter_by(group_id=group_id, user_id=user_id).first():
+        return jsonify({"error": "Access denied"}), 403
+
+    args = request.args
+    limit = max(1, min(args.get('limit', DEFAULT_AUDIT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    try:
+        query = audit_log_query(
+            group_id,
+            after=args.get('after'),
+            start=parse_date_arg(args.get('start')),
+            end=parse_end_arg(args.get('end'))
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    logs = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_cursor(logs[-1][0].timestamp, logs[-1][0].id)
 
     result = [
         {
             "user": username,
             "action": audit.action,
             "timestamp": audit.timestamp,
-            "amount": amount,
-            "description": description,
-            "date": ds
+            "amount": audit.amount,
+            "description": audit.description,
+            "date": audit.expense_ds
         }
-        for audit, username, ds, amount, description in logs
+        for audit, username in logs
     ]
 
-    return jsonify(result)
+    return jsonify({"entries": result, "next_cursor": next_cursor})
 
 @app.route('/api/group/<int:group_id>/spending_split', methods=['GET'])
 @jwt_required()
 def group_spending_split(group_id):
-    # Get all expenses for this group
-    expenses = Expense.query.filter_by(group_id=group_id).all()
-    if not expenses:
+    balances = group_balances(group_id)
+    if not balances["expense_count"]:
         return jsonify({"message": "No expenses yet."}), 200
 
-    # Get total per user
-    user_totals = {}
-    for exp in expenses:
-        user_totals[exp.user_id] = user_totals.get(exp.user_id, 0) + exp.amount
-
-    members = GroupMembership.query.filter_by(group_id=group_id).all()
-    num_members = len(members)
-    total_spent = sum(user_totals.values())
-    share_per_user = total_spent / num_members
-
-    # Build result
-    result = []
-    for m in members:
-        spent = user_totals.get(m.user_id, 0)
-        balance = round(spent - share_per_user, 2)
-
-        if m.adjusted_balance is not None:
-            balance = m.adjusted_balance
-
-        display_spent = round(share_per_user, 2) + balance
-
-        result.append({
-            "user": m.user.username,
-            "total": round(display_spent, 2)   # 👈 not raw spent, but adjusted
-        })
-
+    result = [{
+        "user": m["username"],
+        "total": round(m["spent"], 2)   # 👈 not raw spent, but adjusted
+    } for m in balances["members"]]
 
     return jsonify(result)
 
@@ -700,55 +971,46 @@ def group_spending_split(group_id):
 @app.route('/api/group/<int:group_id>/split-summary', methods=['GET'])
 @jwt_required()
 def split_summary(group_id):
-    current_username = get_jwt_identity()
-    user = User.query.filter_by(username=current_username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"message": "User not found"}), 404
 
-    current_user_id = user.id
-    # Get all expenses for this group
-    expenses = Expense.query.filter_by(group_id=group_id).all()
-    if not expenses:
+    # find current user's role
+    membership = GroupMembership.query.filter_by(group_id=group_id, user_id=user_id).first()
+    role = membership.role if membership else None
+
+    balances = group_balances(group_id)
+    if not balances["expense_count"]:
         # still include user_role for consistency
-        membership = GroupMembership.query.filter_by(group_id=group_id, user_id=current_user_id).first()
-        role = membership.role if membership else None
         return jsonify({"message": "No expenses yet.", "user_role": role}), 200
 
-    # Get total per user
-    user_totals = {}
-    for exp in expenses:
-        user_totals[exp.user_id] = user_totals.get(exp.user_id, 0) + exp.amount
-
-    members = GroupMembership.query.filter_by(group_id=group_id).all()
-    num_members = len(members)
-    total_spent = sum(user_totals.values())
-    share_per_user = total_spent / num_members if num_members > 0 else 0
-
-    # Build result
-    result = []
-    for m in members:
-        spent = user_totals.get(m.user_id, 0)
-        balance = round(spent - share_per_user, 2)
-
-        if m.adjusted_balance is not None:
-            balance = m.adjusted_balance
+    result = [{
+        "username": m["username"],
+        "spent": m["spent"],
+        "should_have_spent": m["should_have_spent"],
+        "balance": m["balance"]  # + means overpaid, - means underpaid
+    } for m in balances["members"]]
 
-        display_spent = round(share_per_user, 2) + balance
+    return jsonify({
+        "user_role": role,   # 👈 now frontend knows if admin/member
+        "summary": result
+    })
 
-        result.append({
-            "username": m.user.username,
-            "spent": display_spent,
-            "should_have_spent": round(share_per_user, 2),
-            "balance": balance  # + means overpaid, - means underpaid
-        })
 
-    # find current user's role
-    membership = GroupMembership.query.filter_by(group_id=group_id, user_id=current_user_id).first()
-    role = membership.role if membership else None
+@app.route('/api/group/<int:group_id>/settlements', methods=['GET'])
+@jwt_required()
+def group_settlements(group_id):
+    user_id = current_user_id()
+    membership = GroupMembership.query.filter_by(group_id=group_id, user_id=user_id).first()
+    if not membership:
+        return jsonify({"error": "Not authorized"}), 403
 
+    balances = group_balances(group_id)
     return jsonify({
-        "user_role": role,   # 👈 now frontend knows if admin/member
-        "summary": result
+        "settlements": balances["settlements"],  # [{"from", "to", "amount"}]
+        "balances": [
+            {"username": m["username"], "balance": m["balance"]} for m in balances["members"]
+        ]
     })
 
 
@@ -761,6 +1023,9 @@ def update_split_summary(group_id):
 
     summary_updates = data["summary"]
 
+    invalidate_group(group_id)
+    current = {m["username"]: m for m in group_balances(group_id)["members"]}
+
     # Example: just log or update balances (depends on your schema)
     for user_data in summary_updates:
         username = user_data.get("username")
@@ -772,20 +1037,21 @@ def update_split_summary(group_id):
             User.username == username
         ).first()
 
-        if member:
-            # ⚠️ You’ll need a place to store balance adjustments in DB
-            member.adjusted_balance = balance  
+        if member and username in current:
+            # Stored as the difference from the balance the expenses give
+            computed = current[username]["balance"] - current[username]["adjustment"]
+            member.adjusted_balance = 0.0 if balance is None else round(float(balance) - computed, 2)
 
     db.session.commit()
+    invalidate_group(group_id)
     return jsonify({"message": "Summary updated successfully"})
 
 
 @app.route("/budgets", methods=["POST"])
 @jwt_required()
 def set_budget():
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
 
     data = request.get_json()
@@ -796,7 +1062,7 @@ def set_budget():
         return jsonify({"error": "Missing category or limit"}), 400
 
     # Check if a budget for this category already exists
-    budget = Budget.query.filter_by(user_id=user.id, category=category).first()
+    budget = Budget.query.filter_by(user_id=user_id, category=category).first()
 
     if budget:
         # Update existing budget
@@ -804,7 +1070,7 @@ def set_budget():
     else:
         # Create a new budget
         new_budget = Budget(
-            user_id=user.id,
+            user_id=user_id,
             category=category,
             limit=limit,
         )
@@ -821,13 +1087,12 @@ def get_budgets():
     Fetches all budget limits and details for the authenticated user.
     Frontend endpoint: GET /api/budgets
     """
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
     
     # 1. Query the database for all Budget entries belonging to the user
-    budgets = Budget.query.filter_by(user_id=user.id).all()
+    budgets = Budget.query.filter_by(user_id=user_id).all()
     
     # 2. Convert SQLAlchemy objects to a list of dictionaries for JSON serialization
     budgets_data = [
@@ -847,9 +1112,8 @@ def get_budgets():
 @app.route("/budget", methods=["POST"])
 @jwt_required()
 def set_monthly_budget():
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
 
     data = request.get_json()
@@ -859,13 +1123,13 @@ def set_monthly_budget():
         return jsonify({"error": "Missing limit"}), 400
 
     # Check if user already has a monthly budget
-    budget = Budget.query.filter_by(user_id=user.id, category="Monthly").first()
+    budget = Budget.query.filter_by(user_id=user_id, category="Monthly").first()
 
 
     if budget:
         budget.limit = limit  # update
     else:
-        budget = Budget(user_id=user.id, category="Monthly", limit=limit)
+        budget = Budget(user_id=user_id, category="Monthly", limit=limit)
         db.session.add(budget)
 
     db.session.commit()
@@ -878,12 +1142,11 @@ def set_monthly_budget():
 @app.route("/budget", methods=["GET"])
 @jwt_required()
 def get_monthly_budget():
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
 
-    budget = Budget.query.filter_by(user_id=user.id, category="Monthly").first()
+    budget = Budget.query.filter_by(user_id=user_id, category="Monthly").first()
     if not budget:
         return jsonify({"error": "No monthly budget set"}), 404
 
@@ -898,13 +1161,12 @@ def get_monthly_budget():
 @app.route("/notifications", methods=["GET"])
 @jwt_required()
 def get_notifications():
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    if not user:
+    user_id = current_user_id()
+    if not user_id:
         return jsonify({"error": "User not found"}), 404
     
-    overspending_alerts = check_overspending(user_id=user.id) 
-    recurring_alerts = check_recurring_reminders(user_id=user.id) 
+    overspending_alerts = check_overspending(user_id=user_id) 
+    recurring_alerts = check_recurring_reminders(user_id=user_id) 
     all_alerts = (overspending_alerts or []) + (recurring_alerts or []) 
     
     return jsonify({"notifications": all_alerts})
@@ -912,7 +1174,7 @@ def get_notifications():
 @app.route("/register-email", methods=["POST"])
 @jwt_required()
 def register_email():
-    user_id = get_jwt_identity()
+    user_id = current_user_id()
     data = request.get_json()
     email = data.get("email")
     dont_show = data.get("dont_show_again", False)
@@ -941,8 +1203,7 @@ def register_email():
 @app.route("/check-email", methods=["GET"])
 @jwt_required()
 def check_email():
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
+    user = User.query.get(current_user_id())
     if not user:
         return jsonify({"error": "User not found"}), 404
     return jsonify({"email": user.email})
@@ -950,48 +1211,76 @@ def check_email():
 @app.route("/chat", methods=["POST"])
 @jwt_required()
 def chat():
-    user_id = get_jwt_identity()
+    user_id = current_user_id()
     message = request.json.get("message", "")
     if not message:
         return jsonify({"error": "No message provided"}), 400
 
-    reply = finance_bot.chat(message, user_id)
+    reply = finance_bot.get().chat(message, user_id)
     return jsonify({"reply": reply})
+
+@app.route("/chat/stats", methods=["GET"])
+@jwt_required()
+def chat_stats():
+    bot = finance_bot.get()
+    return jsonify({
+        "response_cache": bot.response_cache.stats(),
+        "llm_gateway": bot.llm.stats(),
+        "prompts": bot.prompt_builder.stats()
+    })
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.route("/chat/stream", methods=["POST"])
+@jwt_required()
+def chat_stream():
+    """Server-Sent Events: one `data: {"token": ...}` per chunk, then `event: done` with the full reply."""
+    user_id = current_user_id()
+    message = request.json.get("message", "")
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+
+    def generate():
+        parts = []
+        for token in finance_bot.get().chat_stream(message, user_id):
+            parts.append(token)
+            yield sse_event({"token": token})
+        yield sse_event({"reply": "".join(parts).strip()}, event="done")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
     
 def send_recurring_expense_alerts():
     print("🔥 send_recurring_expense_alerts() started")
     with app.app_context():
         today = datetime.today().date()
-        recurring_expenses = Expense.query.filter_by(is_recurring=True).all()
-        print("Found recurring_expenses:", recurring_expenses)
-
-        for expense in recurring_expenses:
-            # Monthly recurring
-            if expense.recurring_interval == "monthly" and expense.ds.day == today.day:
-                user = User.query.get(expense.user_id)
-                if user.email:  # only send if user has registered email
-                    logging.info("Sending monthly reminder to %s for %s", user.email, expense.description)
-                    msg = Message(
-                        subject="🔔 Recurring Expense Reminder",
-                        sender=app.config['MAIL_USERNAME'],
-                        recipients=[user.email],
-                        body=f"Hi {user.username}, reminder: your recurring expense '{expense.description}' of ₹{expense.amount} is due today."
-                    )
-                    mail.send(msg)
-                    print(f"Email sent to {user.email} for {expense.description}")
-            # Weekly recurring
-            elif expense.recurring_interval == "weekly" and expense.ds.weekday() == today.weekday():
-                user = User.query.get(expense.user_id)
-                if user.email:
-                    logging.info("Sending monthly reminder to %s for %s", user.email, expense.description)
-                    msg = Message(
-                        subject="🔔 Weekly Recurring Expense Reminder",
-                        sender=app.config['MAIL_USERNAME'],
-                        recipients=[user.email],
-                        body=f"Hi {user.username}, reminder: your weekly recurring expense '{expense.description}' of ₹{expense.amount} is due today."
-                    )
-                    mail.send(msg)
-                    print(f"Email sent to {user.email} for {expense.description}")
+        stats = {"matched": 0, "queued": 0}
+
+        def reminders():
+            # Due-date matching and the user join both happen in SQL
+            for expense_id, username, email, description, amount, interval in due_recurring_expenses(today):
+                stats["matched"] += 1
+                weekly = interval == "weekly"
+                yield {
+                    "recipient": email,
+                    "subject": "🔔 Weekly Recurring Expense Reminder" if weekly else "🔔 Recurring Expense Reminder",
+                    "body": (
+                        f"Hi {username}, reminder: your weekly recurring expense '{description}' of ₹{amount} is due today."
+                        if weekly else
+                        f"Hi {username}, reminder: your recurring expense '{description}' of ₹{amount} is due today."
+                    ),
+                    "dedup_key": f"recurring:{expense_id}:{today}"
+                }
+
+        # Delivery happens in deliver_outbox; this only queues
+        stats["queued"] = enqueue(reminders())
+        print("Recurring reminders:", stats)
+        return stats
 
 
 def send_budget_alerts():
@@ -999,57 +1288,143 @@ def send_budget_alerts():
 
     try:
         with app.app_context():
-            users = User.query.all()
-            print(f"Found {len(users)} users")
-
-            for user in users:
-                # Fetch the user's monthly budget (if it exists)
-                budget_entry = Budget.query.filter_by(user_id=user.id, category="Monthly").first()
-
-                if not budget_entry:
-                    print(f"⚠️ No monthly budget found for {user.username}, skipping...")
-                    continue
-
-                budget_limit = budget_entry.limit  # use 'limit' field from your model
-
-                # Fetch user's expenses for the current month
-                expenses = Expense.query.filter_by(user_id=user.id).all()
-                monthly_total = sum(
-                    e.amount for e in expenses if e.ds.month == datetime.now().month
-                )
-
-                # Check if they exceeded budget
-                if monthly_total > budget_limit and user.email:
-                    logging.info(
-                        "🚨 Budget alert for %s (spent ₹%s / limit ₹%s)",
-                        user.email,
-                        monthly_total,
-                        budget_limit,
-                    )
-
-                    msg = Message(
-                        subject="🚨 Monthly Budget Alert",
-                        sender=app.config["MAIL_USERNAME"],
-                        recipients=[user.email],
-                        body=(
-                            f"Hi {user.username},\n\n"
-                            f"You've spent ₹{monthly_total} this month, exceeding your budget limit of ₹{budget_limit}.\n"
-                            "Try reviewing your expenses and plan wisely.\n\n"
-                            "— Your AI Expense Tracker 🤖"
-                        ),
-                    )
-                    mail.send(msg)
-                    print(f"✅ Mail sent successfully to {user.email}")
-                else:
-                    print(f"✅ {user.username} is within budget (₹{monthly_total} / ₹{budget_limit})")
+            now = datetime.now()
+            today = now.date()
+
+            # Only over-budget users come back from the database
+            alerts = [{
+                "recipient": email,
+                "subject": "🚨 Monthly Budget Alert",
+                "body": (
+                    f"Hi {username},\n\n"
+                    f"You've spent ₹{monthly_total} this month, exceeding your budget limit of ₹{budget_limit}.\n"
+                    "Try reviewing your expenses and plan wisely.\n\n"
+                    "— Your AI Expense Tracker 🤖"
+                ),
+                "dedup_key": f"budget:{email}:{today}"
+            } for username, email, budget_limit, monthly_total in over_budget_users(now.year, now.month)]
+
+            queued = enqueue(alerts)
+            print(f"Budget alerts: {len(alerts)} over budget, {queued} queued")
 
     except Exception as e:
         print("❌ Error in send_budget_alerts():", e)
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(func=send_recurring_expense_alerts, trigger="interval", days=1)
-scheduler.add_job(func=send_budget_alerts, trigger="cron", hour=20)
-scheduler.start()
+
+def deliver_outbox():
+    with app.app_context():
+        stats = deliver_pending(app, mail)
+        if any(stats.values()):
+            print("Outbox delivery:", stats)
+        return stats
+
+def prune_outbox():
+    with app.app_context():
+        deleted = prune_delivered()
+        print("Outbox pruned:", deleted)
+        return deleted
+
+def prune_chat_memory():
+    """Delete expired turns from the shared chat_message table.
+
+    In-memory sessions belong to each worker and expire lazily on access
+    there, so the lease holder has nothing to prune for them. The DB store
+    is used directly so this job never loads the chatbot itself.
+    """
+    from chatbot.memory import CHAT_MEMORY_BACKEND, DBMemoryStore
+    if CHAT_MEMORY_BACKEND != "db":
+        return 0
+    with app.app_context():
+        return DBMemoryStore().prune()
+
+SCHEDULED_JOBS = [
+    (send_recurring_expense_alerts, {"trigger": "interval", "days": 1}),
+    (send_budget_alerts, {"trigger": "cron", "hour": 20}),
+    (deliver_outbox, {"trigger": "interval", "minutes": 1}),
+    (prune_outbox, {"trigger": "cron", "hour": 3}),
+    (prune_chat_memory, {"trigger": "interval", "minutes": 10}),
+]
+
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "embedded")
+
+def start_scheduler():
+    scheduler = build_scheduler(app, SCHEDULED_JOBS)
+    scheduler.start()
+    return scheduler
+
+# Every worker may schedule, but only the lease holder runs the jobs (see scheduler.py).
+# Started once at boot, so jobs run even on a worker that never gets a request;
+# a failed start shows up in /readyz and is retried only by warm_up_app().
+background_scheduler = LazyResource("scheduler", start_scheduler)
+
+# Forecast pool workers are spawned; under `python app.py` each one re-imports this
+# module as __mp_main__ and must not start a scheduler or warm up models of its own
+IN_MAIN_PROCESS = multiprocessing.parent_process() is None
+
+if SCHEDULER_MODE == "embedded" and IN_MAIN_PROCESS:
+    try:
+        background_scheduler.get()
+    except Exception as e:
+        print("[ERROR] scheduler start failed:", e)
+
+# off: everything loads on first use; background: load in a thread at boot;
+# blocking: load before the module finishes importing
+WARM_UP = os.getenv("WARM_UP", "off")
+WARM_UP_RESOURCES = ["categorizer", "chatbot"]
+
+def warm_up_app():
+    """Load the heavy components now; also usable from a gunicorn post_fork hook."""
+    names = WARM_UP_RESOURCES + (["scheduler"] if SCHEDULER_MODE == "embedded" else [])
+    with app.app_context():
+        return warm_up(names)
+
+if IN_MAIN_PROCESS and WARM_UP == "blocking":
+    warm_up_app()
+elif IN_MAIN_PROCESS and WARM_UP == "background":
+    threading.Thread(target=warm_up_app, name="warm-up", daemon=True).start()
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests. Touches nothing else."""
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: the database answers and, with warm-up on, the heavy components are loaded."""
+    try:
+        db.session.execute(text("SELECT 1"))
+        database = "ok"
+    except Exception as e:
+        db.session.rollback()  # leave the pooled connection usable for the next request
+        database = str(e)
+
+    status = {name: resource.status() for name, resource in resources.items()}
+    warming = WARM_UP != "off" and not all(resources[name].loaded for name in WARM_UP_RESOURCES)
+    ready = database == "ok" and not warming
+
+    return jsonify({
+        "status": "ready" if ready else "not ready",
+        "database": database,
+        "resources": status
+    }), 200 if ready else 503
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Backfill MonthlyCategoryTotal from the expense table."""
+    rebuild_rollup()
+    print(f"Rebuilt {MonthlyCategoryTotal.query.count()} monthly category totals")
+
+
+@app.cli.command("deliver-outbox")
+@click.option("--interval", default=0, help="Keep draining every N seconds instead of once.")
+def deliver_outbox_command(interval):
+    """Run the mail delivery worker outside the web process."""
+    while True:
+        deliver_outbox()
+        if not interval:
+            break
+        time.sleep(interval)
+
 
 @app.route('/')
 def home():
@@ -1,7 +1,8 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
 from flask_cors import CORS
+from cache import LRUCache
 from models import db, User
-from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, get_jwt_identity, jwt_required
 
 auth_bp = Blueprint("auth", __name__)
 CORS(auth_bp, resources={r"/*": {"origins": "*"}})  # Enables CORS for all domains on all routes
@@ -22,8 +23,9 @@ def login():
     data = request.get_json()
     user = User.query.filter_by(username=data["username"]).first()
     if user and user.check_password(data["password"]):
-        access_token = create_access_token(identity=user.username)
-        refresh_token = create_refresh_token(identity=user.username)
+        claims = {"uid": user.id}
+        access_token = create_access_token(identity=user.username, additional_claims=claims)
+        refresh_token = create_refresh_token(identity=user.username, additional_claims=claims)
         return jsonify({
             "status": "success",
             "token": access_token,
@@ -36,6 +38,30 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     current_user = get_jwt_identity()
-    new_token = create_access_token(identity=current_user)
+    new_token = create_access_token(identity=current_user, additional_claims={"uid": current_user_id()})
     return jsonify({"status": "success", "token": new_token})
 
+
+# Username -> id for tokens issued before the "uid" claim existed
+_user_ids = LRUCache(maxsize=4096, ttl=300)
+
+def current_user_id():
+    """Id of the authenticated user, read from the token without a query.
+
+    Tokens from before the "uid" claim fall back to one username lookup,
+    cached for a few minutes. The result is memoised on flask.g for the
+    rest of the request.
+    """
+    if "user_id" not in g:
+        user_id = get_jwt().get("uid")
+        if user_id is None:
+            username = get_jwt_identity()
+            user_id = _user_ids.get(username)
+            if user_id is None:
+                user = User.query.filter_by(username=username).first()
+                user_id = user.id if user else None
+                if user_id is not None:
+                    _user_ids.set(username, user_id)
+        g.user_id = user_id
+    return g.user_id
+
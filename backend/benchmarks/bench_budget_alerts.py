@@ -0,0 +1,126 @@
+"""Nightly budget-alert selection: the old per-user loop against the single
+grouped query in utils.over_budget_users.
+
+Seeds a throwaway database with users, monthly budgets and expenses, builds
+the monthly rollup, then times both ways of finding the users to email.
+
+Usage (from backend/):
+    python benchmarks/bench_budget_alerts.py --users 10000 --expenses 40
+
+Set BENCH_DATABASE_URL to run against an empty Postgres database instead of
+a temporary SQLite file.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from models import db, Budget, Expense, User
+from rollup import rebuild_rollup
+from utils import over_budget_users
+
+
+def seed(users, expenses_per_user):
+    rng = random.Random(42)
+    now = datetime.now()
+    db.session.execute(User.__table__.insert(), [
+        {'id': u, 'username': f'user{u}', 'password_hash': 'x',
+         'email': f'user{u}@example.com' if u % 3 else None}
+        for u in range(1, users + 1)
+    ])
+    db.session.execute(Budget.__table__.insert(), [
+        {'user_id': u, 'category': 'Monthly', 'limit': float(rng.randint(2000, 60000)),
+         'start_date': now}
+        for u in range(1, users + 1) if u % 4
+    ])
+
+    batch = []
+    for u in range(1, users + 1):
+        for _ in range(expenses_per_user):
+            batch.append({
+                'user_id': u,
+                'ds': now - timedelta(days=rng.randint(0, 720)),
+                'amount': round(rng.uniform(10, 3000), 2),
+                'category': rng.choice(['Food', 'Transport', 'Shopping', 'Other']),
+                'description': 'seeded',
+                'is_recurring': False,
+            })
+        if len(batch) >= 20000:
+            db.session.execute(Expense.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Expense.__table__.insert(), batch)
+    db.session.commit()
+    rebuild_rollup()
+
+
+def legacy_over_budget():
+    """The pre-rewrite job: every user, a budget query each, all expenses in Python."""
+    found = []
+    month = datetime.now().month
+    for user in User.query.all():
+        budget_entry = Budget.query.filter_by(user_id=user.id, category="Monthly").first()
+        if not budget_entry:
+            continue
+        expenses = Expense.query.filter_by(user_id=user.id).all()
+        monthly_total = sum(e.amount for e in expenses if e.ds.month == month)
+        if monthly_total > budget_entry.limit and user.email:
+            found.append(user.email)
+    return found
+
+
+def grouped_over_budget():
+    now = datetime.now()
+    return [email for _, email, _, _ in over_budget_users(now.year, now.month)]
+
+
+def timed(label, fn):
+    db.session.expire_all()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed * 1000:10.1f} ms   {len(result)} users to alert")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--expenses", type=int, default=40, help="expenses per user")
+    args = parser.parse_args()
+
+    tmp = None
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        url = f"sqlite:///{tmp.name}"
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        try:
+            seed(args.users, args.expenses)
+            print(f"Seeded {args.users} users, {args.users * args.expenses} expenses on {db.engine.dialect.name}")
+            legacy = timed("legacy", legacy_over_budget)
+            grouped = timed("grouped", grouped_over_budget)
+            # The legacy loop also counts this month of previous years, so it over-reports
+            print(f"grouped result is a subset of legacy: {set(grouped) <= set(legacy)}")
+        finally:
+            db.session.remove()
+            db.drop_all()
+            if tmp is not None:
+                os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
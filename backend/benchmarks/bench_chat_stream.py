@@ -0,0 +1,54 @@
+"""Time to first token vs. time to full reply for chat, against a local fake
+Ollama server (benchmarks/fake_ollama.py).
+
+/chat waits for the whole reply; /chat/stream forwards the first token as soon
+as Ollama produces it. The gap between the two columns is the latency the
+streaming endpoint removes from the user's view.
+
+Usage (from backend/):
+    python benchmarks/bench_chat_stream.py --tokens 200 --token-delay 0.05
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import FakeOllama
+from chatbot.llm_interface import LLMInterface
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with FakeOllama(args.tokens, args.token_delay, args.first_token_delay) as fake:
+        llm = LLMInterface(host=fake.url)
+
+        for run in range(1, args.runs + 1):
+            start = time.perf_counter()
+            reply = llm.get_reply("hello")
+            full = time.perf_counter() - start
+            assert reply.startswith("tok0"), reply
+
+            start = time.perf_counter()
+            first = None
+            received = 0
+            for _ in llm.stream_reply("hello"):
+                if first is None:
+                    first = time.perf_counter() - start
+                received += 1
+            streamed = time.perf_counter() - start
+            assert received == args.tokens, received
+
+            print(f"run {run}: get_reply {full * 1000:8.1f} ms | "
+                  f"stream first token {first * 1000:8.1f} ms, last token {streamed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
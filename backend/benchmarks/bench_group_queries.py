@@ -0,0 +1,103 @@
+"""SQL statements issued per request by the group endpoints, for growing
+group sizes. Every count should stay flat as the group grows; the script
+exits with status 1 when any endpoint's count differs between sizes.
+
+Usage (from backend/):
+    python benchmarks/bench_group_queries.py --sizes 5 50 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file.name}"
+os.environ.setdefault("JWT_SECRET_KEY", "bench")
+os.environ["SCHEDULER_MODE"] = "off"
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import app
+from models import db, Expense, Group, GroupMembership, User
+from settlements import invalidate_group
+
+ENDPOINTS = [
+    "/api/groups",
+    "/api/group_users/{group_id}",
+    "/api/groups/{group_id}/expenses",
+    "/api/group/{group_id}/split-summary",
+    "/api/group/{group_id}/spending_split",
+    "/api/group/{group_id}/settlements",
+]
+
+
+def seed_group(size, first_user_id):
+    group = Group(name=f"group of {size}", created_by=first_user_id)
+    db.session.add(group)
+    db.session.flush()
+    for i in range(size):
+        user = User(id=first_user_id + i, username=f"user{first_user_id + i}", password_hash="x")
+        db.session.add(user)
+        db.session.add(GroupMembership(user_id=user.id, group_id=group.id, role="admin" if i == 0 else "member"))
+        db.session.add(Expense(user_id=user.id, group_id=group.id, ds=datetime.utcnow(),
+                               amount=10.0 * (i + 1), category="Food"))
+    db.session.commit()
+    return group.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500])
+    args = parser.parse_args()
+
+    statements = []
+    client = app.test_client()
+
+    with app.app_context():
+        db.create_all()
+        event.listen(db.engine, "before_cursor_execute", lambda *a, **k: statements.append(a[2]))
+
+        groups = []
+        next_user = 1
+        for size in args.sizes:
+            groups.append((size, seed_group(size, next_user), next_user))
+            next_user += size
+        token_for = {
+            admin: create_access_token(identity=f"user{admin}", additional_claims={"uid": admin})
+            for _, _, admin in groups
+        }
+
+    growing = []
+    print(f"{'endpoint':<40}" + "".join(f"{size:>8}" for size in args.sizes))
+    for endpoint in ENDPOINTS:
+        counts = []
+        for size, group_id, admin in groups:
+            invalidate_group(group_id)  # measure the uncached path
+            statements.clear()
+            response = client.get(endpoint.format(group_id=group_id),
+                                  headers={"Authorization": f"Bearer {token_for[admin]}"})
+            assert response.status_code == 200, (endpoint, response.status_code, response.get_data(as_text=True))
+            counts.append(len(statements))
+        flat = ""
+        if len(set(counts)) > 1:
+            growing.append(endpoint)
+            flat = "   <-- grows with group size"
+        print(f"{endpoint:<40}" + "".join(f"{c:>8}" for c in counts) + flat)
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    os.unlink(_db_file.name)
+
+    if growing:
+        print(f"\nFAIL: query count depends on group size for {len(growing)} endpoint(s)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
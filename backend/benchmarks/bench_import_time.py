@@ -0,0 +1,75 @@
+"""Import cost of the app module, from `python -X importtime`.
+
+Imports app in a fresh interpreter (scheduler and warm-up off), prints the
+total import time and the slowest top-level packages, and fails when the
+total exceeds --budget-ms, so a heavy import creeping back in shows up.
+
+Usage (from backend/):
+    python benchmarks/bench_import_time.py --runs 3 --top 15 --budget-ms 1500
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must stay out of the import path; they load lazily on first use
+LAZY_MODULES = ["prophet", "pandas", "joblib", "sklearn", "chatbot.chatbot"]
+
+
+def import_profile(module):
+    """{module: (self_us, cumulative_us)} for one import of module in a fresh interpreter."""
+    env = dict(os.environ, SCHEDULER_MODE="off", WARM_UP="off")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        profile = import_profile(args.module)
+        totals.append(profile[args.module][1] / 1000)
+    best = min(totals)
+
+    # Top-level packages (no dot) by cumulative time, from the last run
+    roots = sorted(
+        ((name, cumulative) for name, (_, cumulative) in profile.items() if "." not in name),
+        key=lambda item: item[1], reverse=True
+    )
+    print(f"import {args.module}: best {best:.0f} ms over {args.runs} runs "
+          f"({', '.join(f'{t:.0f}' for t in totals)} ms)")
+    print(f"{'package':<32}{'cumulative ms':>14}")
+    for name, cumulative in roots[:args.top]:
+        print(f"{name:<32}{cumulative / 1000:>14.1f}")
+
+    eager = [name for name in LAZY_MODULES if name in profile]
+    if eager:
+        print("imported eagerly (should be lazy):", ", ".join(eager))
+
+    if args.budget_ms is not None and (best > args.budget_ms or eager):
+        sys.exit(f"import {args.module} over budget: {best:.0f} ms > {args.budget_ms:.0f} ms"
+                 if best > args.budget_ms else "heavy modules imported eagerly")
+
+
+if __name__ == "__main__":
+    main()
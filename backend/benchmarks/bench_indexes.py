@@ -0,0 +1,187 @@
+"""Query plans and timings for the hot query patterns, before and after
+the indexes added in migration b3e91c4d7a20.
+
+Seeds a throwaway database, runs every query without the new indexes,
+creates them, and runs everything again.
+
+Usage (from backend/):
+    python benchmarks/bench_indexes.py --users 500 --expenses 400
+
+Set BENCH_DATABASE_URL to run against an empty Postgres database instead of
+a temporary SQLite file.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+
+from models import db
+
+NEW_CONSTRAINTS = {'uq_group_membership_group_user', 'uq_budget_user_category'}
+
+QUERIES = {
+    "expenses of a user this month": (
+        "SELECT SUM(amount) FROM expense WHERE user_id = :user_id AND ds >= :start AND ds < :end"
+    ),
+    "expenses of a group": "SELECT id, amount FROM expense WHERE group_id = :group_id",
+    "membership lookup": (
+        "SELECT id, role FROM group_membership WHERE group_id = :group_id AND user_id = :user_id"
+    ),
+    "groups of a user": "SELECT group_id, role FROM group_membership WHERE user_id = :user_id",
+    "audit rows of an expense": "SELECT id, action FROM expense_audit WHERE expense_id = :expense_id",
+    "rules of a user": "SELECT keyword, category FROM rule WHERE user_id = :user_id",
+    "monthly budget": "SELECT \"limit\" FROM budget WHERE user_id = :user_id AND category = 'Monthly'",
+}
+
+
+def bare_metadata():
+    """Copy of the models' metadata without the indexes this migration adds."""
+    metadata = sa.MetaData()
+    for table in db.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        copy.indexes.clear()
+        copy.constraints = {
+            c for c in copy.constraints
+            if not (isinstance(c, sa.UniqueConstraint) and c.name in NEW_CONSTRAINTS)
+        }
+    return metadata
+
+
+def create_new_indexes(conn):
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn)
+        for constraint in table.constraints:
+            if isinstance(constraint, sa.UniqueConstraint) and constraint.name in NEW_CONSTRAINTS:
+                sa.Index(constraint.name, *constraint.columns, unique=True).create(conn)
+
+
+def seed(conn, metadata, users, expenses_per_user, groups):
+    t = metadata.tables
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    categories = ["Food", "Transport", "Shopping", "Health", "Entertainment", "Other"]
+
+    conn.execute(t['user'].insert(), [
+        {'id': u, 'username': f'user{u}', 'password_hash': 'x'} for u in range(1, users + 1)
+    ])
+    conn.execute(t['group'].insert(), [
+        {'id': g, 'name': f'group{g}', 'created_by': g} for g in range(1, groups + 1)
+    ])
+    conn.execute(t['group_membership'].insert(), [
+        {'group_id': (u % groups) + 1, 'user_id': u, 'role': 'member', 'adjusted_balance': 0.0}
+        for u in range(1, users + 1)
+    ])
+    conn.execute(t['budget'].insert(), [
+        {'user_id': u, 'category': c, 'limit': 5000.0}
+        for u in range(1, users + 1) for c in ('Monthly', rng.choice(categories))
+    ])
+    conn.execute(t['rule'].insert(), [
+        {'user_id': u, 'keyword': f'kw{k}', 'category': rng.choice(categories)}
+        for u in range(1, users + 1) for k in range(5)
+    ])
+
+    expense_id = 0
+    for u in range(1, users + 1):
+        rows = []
+        for _ in range(expenses_per_user):
+            expense_id += 1
+            rows.append({
+                'id': expense_id,
+                'user_id': u,
+                'ds': now - timedelta(days=rng.randint(0, 730)),
+                'amount': round(rng.uniform(10, 2000), 2),
+                'category': rng.choice(categories),
+                'description': 'seeded',
+                'is_recurring': False,
+                'group_id': (u % groups) + 1 if rng.random() < 0.2 else None,
+            })
+        conn.execute(t['expense'].insert(), rows)
+        conn.execute(t['expense_audit'].insert(), [
+            {'expense_id': r['id'], 'user_id': u, 'action': 'created', 'timestamp': r['ds']}
+            for r in rows
+        ])
+    return expense_id
+
+
+def random_params(rng, users, groups, expenses):
+    now = datetime.utcnow()
+    return {
+        'user_id': rng.randint(1, users),
+        'group_id': rng.randint(1, groups),
+        'expense_id': rng.randint(1, expenses),
+        'start': datetime(now.year, now.month, 1),
+        'end': now + timedelta(days=1),
+    }
+
+
+def explain(conn, sql, params):
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    rows = conn.execute(sa.text(prefix + sql), params).fetchall()
+    return "; ".join(str(row[-1]) for row in rows)
+
+
+def run_suite(conn, label, args, expenses):
+    rng = random.Random(7)
+    print(f"\n=== {label} ===")
+    results = {}
+    for name, sql in QUERIES.items():
+        plan = explain(conn, sql, random_params(rng, args.users, args.groups, expenses))
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            conn.execute(sa.text(sql), random_params(rng, args.users, args.groups, expenses)).fetchall()
+        ms = (time.perf_counter() - start) * 1000 / args.repeat
+        results[name] = ms
+        print(f"{name:<32} {ms:8.3f} ms   {plan}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--expenses", type=int, default=400, help="expenses per user")
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    tmp = None
+    if not url:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        url = f"sqlite:///{tmp.name}"
+
+    engine = sa.create_engine(url)
+    metadata = bare_metadata()
+    try:
+        with engine.begin() as conn:
+            metadata.create_all(conn)
+            expenses = seed(conn, metadata, args.users, args.expenses, args.groups)
+            conn.execute(sa.text("ANALYZE"))
+        print(f"Seeded {args.users} users, {expenses} expenses on {engine.dialect.name}")
+
+        with engine.begin() as conn:
+            before = run_suite(conn, "before", args, expenses)
+            create_new_indexes(conn)
+            conn.execute(sa.text("ANALYZE"))
+            after = run_suite(conn, "after", args, expenses)
+
+        print("\n=== speedup ===")
+        for name in QUERIES:
+            print(f"{name:<32} {before[name] / max(after[name], 1e-9):6.1f}x")
+    finally:
+        if tmp is None:
+            metadata.drop_all(engine)
+        else:
+            engine.dispose()
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Burst behaviour of the LLM gateway against a local fake Ollama server
+(benchmarks/fake_ollama.py).
+
+Three scenarios, each checked; the script exits with status 1 when a check fails:
+  coalesce  N concurrent identical prompts -> exactly one upstream call
+  burst     N concurrent distinct prompts  -> never more than --slots upstream
+            at once, the rest wait for a slot or are turned away after --admission
+  slow      the first token takes longer than --slow -> breaker opens after
+            --threshold calls and refuses further calls without touching Ollama;
+            after --cooldown one probe is let through (half open) and a fast
+            reply closes the breaker again
+
+Usage (from backend/):
+    python benchmarks/bench_llm_gateway.py --clients 20 --slots 2
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import FakeOllama
+from chatbot.gateway import BUSY_REPLY, CircuitBreaker, LLMGateway
+from chatbot.llm_interface import LLMInterface
+
+
+def burst(gateway, prompts):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        replies = list(pool.map(gateway.get_reply, prompts))
+    elapsed = time.perf_counter() - start
+    busy = sum(1 for reply in replies if reply == BUSY_REPLY)
+    return elapsed, busy
+
+
+def check(failures, ok, message):
+    print(f"  {'ok  ' if ok else 'FAIL'} {message}")
+    if not ok:
+        failures.append(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--slots", type=int, default=2)
+    parser.add_argument("--admission", type=float, default=1.0)
+    parser.add_argument("--slow", type=float, default=0.5)
+    parser.add_argument("--threshold", type=int, default=2)
+    parser.add_argument("--cooldown", type=float, default=1.0)
+    args = parser.parse_args()
+    failures = []
+
+    with FakeOllama(tokens=10, token_delay=0.02, first_token_delay=0.2) as fake:
+        gateway = LLMGateway(LLMInterface(host=fake.url), max_in_flight=args.slots,
+                             admission_timeout=args.admission, slow_seconds=args.slow)
+
+        elapsed, busy = burst(gateway, ["same question"] * args.clients)
+        print(f"coalesce: {args.clients} clients, {fake.requests} upstream call(s), "
+              f"{busy} turned away, {elapsed * 1000:.0f} ms")
+        check(failures, fake.requests == 1, f"identical prompts made 1 upstream call (got {fake.requests})")
+        check(failures, busy == 0, f"no coalesced client was turned away (got {busy})")
+
+        fake.requests = fake.max_in_flight = 0
+        elapsed, busy = burst(gateway, [f"question {i}" for i in range(args.clients)])
+        print(f"burst:    {args.clients} clients, {fake.requests} upstream calls, "
+              f"{busy} turned away, {elapsed * 1000:.0f} ms")
+        check(failures, fake.max_in_flight <= args.slots,
+              f"at most {args.slots} upstream calls at once (saw {fake.max_in_flight})")
+        check(failures, fake.requests + busy == args.clients,
+              f"every client was either served or turned away ({fake.requests} + {busy})")
+
+    with FakeOllama(tokens=2, token_delay=0.01, first_token_delay=args.slow * 2) as fake:
+        gateway = LLMGateway(LLMInterface(host=fake.url), max_in_flight=args.slots,
+                             admission_timeout=args.admission, slow_seconds=args.slow,
+                             breaker=CircuitBreaker(threshold=args.threshold, cooldown=args.cooldown))
+        for i in range(6):
+            gateway.get_reply(f"slow {i}")
+        print(f"slow:     6 calls, {fake.requests} reached Ollama, breaker {gateway.breaker.state}")
+        check(failures, gateway.breaker.state == "open", f"breaker opened (state {gateway.breaker.state})")
+        check(failures, fake.requests == args.threshold,
+              f"only {args.threshold} calls reached Ollama before it opened (got {fake.requests})")
+
+        time.sleep(args.cooldown)
+        fake.first_token_delay = args.slow / 2  # healthy again, but slow enough to watch the probe
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            probe = pool.submit(gateway.get_reply, "probe")
+            time.sleep(args.slow / 4)
+            state = gateway.breaker.state
+            refused = gateway.get_reply("during probe")
+            probe_reply = probe.result()
+        check(failures, state == "half_open", f"breaker half open during the probe (state {state})")
+        check(failures, refused == BUSY_REPLY, "a second call during the probe was refused")
+        check(failures, probe_reply != BUSY_REPLY and fake.requests == args.threshold + 1,
+              f"the probe alone reached Ollama ({fake.requests - args.threshold} call(s))")
+        check(failures, gateway.breaker.state == "closed",
+              f"a fast probe closed the breaker (state {gateway.breaker.state})")
+        print("gateway stats:", gateway.stats())
+
+    if failures:
+        print(f"\nFAIL: {len(failures)} check(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""A local stand-in for Ollama's /api/generate, for the chat benchmarks.
+
+Streams NDJSON like the real server: a fixed number of tokens, each after a
+configurable delay, then a final {"done": true} line.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllama:
+    def __init__(self, tokens=40, token_delay=0.05, first_token_delay=0.2):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0  # most requests seen streaming at the same time
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests += 1
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+
+                    time.sleep(fake.first_token_delay)
+                    for i in range(fake.tokens):
+                        self._chunk({"model": body["model"], "response": f"tok{i} ", "done": False})
+                        time.sleep(fake.token_delay)
+                    self._chunk({"model": body["model"], "response": "", "done": True})
+                    self.wfile.write(b"0\r\n\r\n")
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _chunk(self, data):
+                line = (json.dumps(data) + "\n").encode()
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
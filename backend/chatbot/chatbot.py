@@ -1,65 +1,109 @@
-from chatbot.llm_interface import LLMInterface
-from chatbot.memory import ConversationBufferMemory
+import logging
+import re
+
+from chatbot.llm_interface import LLMInterface, FALLBACK_REPLY
+from chatbot.gateway import LLMGateway, GatewayBusy, CircuitOpen, BUSY_REPLY
+from chatbot.memory import make_memory_store
 from chatbot.storage import Storage
 from chatbot.planner import Planner
 from chatbot.query_engine import QueryEngine
+from chatbot.response_cache import ResponseCache, data_version
+from chatbot.prompt_builder import PromptBuilder
 from models import db
-import json
+
+# Questions that lean on the previous exchange: "and last month?", "why is that?"
+FOLLOW_UP = re.compile(r"^\s*(and|but|also|so|then|what about|how about|why)\b|\b(it|that|those|them)\b", re.IGNORECASE)
 
 class FinanceChatBot:
     def __init__(self):
-        self.llm = LLMInterface()
-        self.memory = ConversationBufferMemory(max_turns=10)
+        self.llm = LLMGateway(LLMInterface())
+        self.memory = make_memory_store()
         self.storage = Storage()
         self.planner = Planner()
         self.query_engine = QueryEngine(db)
+        self.response_cache = ResponseCache()
+        self.prompt_builder = PromptBuilder()
 
-    def _get_system_prompt(self) -> str:
-        return """
-You are FinMate, an intelligent personal finance assistant integrated into a user's expense tracker app.
-
-Goals:
-- Help users understand their spending habits.
-- Give budgeting, saving, and financial wellness advice.
-- Keep tone friendly, supportive, and practical.
-- Reference their expense data when useful.
-- Never reveal internal system details or raw JSON.
+    def _history(self, user_id: int):
+        # The question was just appended to memory; it goes in the prompt once, at the end
+        return self.memory.get_messages(user_id)[:-1]
 
-Example abilities:
-- Summarize expenses by category.
-- Suggest areas to save money.
-- Encourage healthy financial habits.
+    def _cache_key(self, user_input: str, user_id: int, snapshot, history) -> str:
+        # A repeated question over unchanged data gets the same answer; only a follow-up
+        # like "and last month?" is also keyed on the exchange it follows
+        context = data_version(history[-2:]) if history and FOLLOW_UP.search(user_input) else ""
+        return self.response_cache.make_key(self.llm.model, user_id, user_input, data_version(snapshot), context)
 
-Keep responses concise and conversational.
-"""
+    def _build_prompt(self, user_input: str, user_id: int, snapshot, history) -> str:
+        prompt, tokens = self.prompt_builder.build(user_input, history, snapshot["summary"])
+        logging.info("chat prompt tokens for user %s: %s", user_id, tokens)
+        return prompt
 
     def chat(self, user_input: str, user_id: int):
         # Step 1 — Save user input
-        self.memory.update("user", user_input)
+        self.memory.append(user_id, "user", user_input)
 
         # Step 2 — If it's a query about spending, call QueryEngine
-        if any(word in user_input.lower() for word in ["spent", "expense", "spending", "budget", "cost"]):
-            db_response = self.query_engine.parse_query(user_input, user_id)
-            self.memory.update("assistant", db_response)
+        query = self.query_engine.match(user_input, user_id)
+        if query is not None:
+            db_response = self.query_engine.answer(query, user_id)
+            self.memory.append(user_id, "assistant", db_response)
             return db_response
 
-        # Step 3 — Otherwise use LLM for normal finance talk
-        memory_context = self.memory.get_context()
-        recent_expenses = self.storage.get_recent_expenses()
-        expense_context = json.dumps(recent_expenses, indent=2)
-        system_prompt = self._get_system_prompt()
+        # Step 3 — Otherwise use LLM for normal finance talk, unless it answered this already
+        snapshot = self.storage.get_expense_context(user_id)
+        history = self._history(user_id)
+        cache_key = self._cache_key(user_input, user_id, snapshot, history)
+        reply = self.response_cache.get(cache_key)
+        if reply is None:
+            reply = self.llm.get_reply(self._build_prompt(user_input, user_id, snapshot, history))
+            if reply and reply not in (FALLBACK_REPLY, BUSY_REPLY):
+                self.response_cache.set(cache_key, reply)
+        self.memory.append(user_id, "assistant", reply)
+        return reply
 
-        final_prompt = f"""{system_prompt}
+    def chat_stream(self, user_input: str, user_id: int):
+        """Like chat(), but yields the reply in pieces as the LLM produces them.
 
---- Conversation Memory ---
-{memory_context}
+        The full reply is saved to memory once the stream completes; a stream
+        abandoned by the client leaves no assistant turn behind.
+        """
+        self.memory.append(user_id, "user", user_input)
 
---- Recent Expenses ---
-{expense_context}
+        query = self.query_engine.match(user_input, user_id)
+        if query is not None:
+            db_response = self.query_engine.answer(query, user_id)
+            self.memory.append(user_id, "assistant", db_response)
+            yield db_response
+            return
 
-User: {user_input}
-Assistant:"""
+        snapshot = self.storage.get_expense_context(user_id)
+        history = self._history(user_id)
+        cache_key = self._cache_key(user_input, user_id, snapshot, history)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            self.memory.append(user_id, "assistant", cached)
+            yield cached
+            return
 
-        reply = self.llm.get_reply(final_prompt)
-        self.memory.update("assistant", reply)
-        return reply
+        prompt = self._build_prompt(user_input, user_id, snapshot, history)
+        parts = []
+        complete = False
+        try:
+            for token in self.llm.stream_reply(prompt):
+                parts.append(token)
+                yield token
+            complete = True
+        except (GatewayBusy, CircuitOpen):
+            parts = [BUSY_REPLY]
+            yield BUSY_REPLY
+        except Exception as e:
+            print(f"❌ Ollama failed: {e}")
+            if not parts:
+                parts.append(FALLBACK_REPLY)
+                yield FALLBACK_REPLY
+        reply = "".join(parts).strip()
+        if complete and reply:
+            # Only whole replies are reused; a cut-off one is kept in memory but not cached
+            self.response_cache.set(cache_key, reply)
+        self.memory.append(user_id, "assistant", reply)
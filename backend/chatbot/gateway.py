@@ -0,0 +1,169 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from chatbot.llm_interface import FALLBACK_REPLY
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 2))
+LLM_ADMISSION_TIMEOUT = float(os.getenv("LLM_ADMISSION_TIMEOUT", 10))
+LLM_SLOW_SECONDS = float(os.getenv("LLM_SLOW_SECONDS", 30))  # time to first token
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 3))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+LLM_COALESCE_TIMEOUT = float(os.getenv("LLM_COALESCE_TIMEOUT", 120))  # how long a caller waits on a shared call
+
+BUSY_REPLY = "FinMate is handling a lot of questions right now. Please try again in a moment."
+
+class GatewayBusy(Exception):
+    """No LLM slot freed up within the admission timeout."""
+
+class CircuitOpen(Exception):
+    """The LLM has been failing or slow; calls are refused until the cooldown passes."""
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failed or slow calls.
+
+    After `cooldown` seconds a single probe call is let through; its outcome
+    closes the breaker again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+                return True
+            return False  # open, or a probe is already running
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.state = "closed"
+                self._failures = 0
+                return
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+class LLMGateway:
+    """Front door for every LLM call made by a request handler.
+
+    - at most max_in_flight calls reach Ollama; others wait up to
+      admission_timeout for a slot and are then turned away (GatewayBusy)
+    - identical prompts already in flight share one call (get_reply only;
+      each stream_reply caller gets its own call, since its tokens are
+      consumed as they arrive)
+    - a circuit breaker stops calling Ollama while it fails or is slow
+      to produce a first token
+    """
+
+    def __init__(self, llm, max_in_flight=LLM_MAX_IN_FLIGHT, admission_timeout=LLM_ADMISSION_TIMEOUT,
+                 slow_seconds=LLM_SLOW_SECONDS, coalesce_timeout=LLM_COALESCE_TIMEOUT, breaker=None):
+        self.llm = llm
+        self.model = llm.model
+        self.admission_timeout = admission_timeout
+        self.slow_seconds = slow_seconds
+        self.coalesce_timeout = coalesce_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending = {}  # prompt hash -> Future shared by identical calls
+        self._stats = {"calls": 0, "coalesced": 0, "rejected_busy": 0, "rejected_open": 0,
+                       "failures": 0, "in_flight": 0, "waiting": 0}
+
+    def _count(self, stat, delta=1):
+        with self._lock:
+            self._stats[stat] += delta
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count("rejected_open")
+            raise CircuitOpen()
+        self._count("waiting")
+        admitted = self._slots.acquire(timeout=self.admission_timeout)
+        self._count("waiting", -1)
+        if not admitted:
+            self._count("rejected_busy")
+            # A probe that never ran must not leave the breaker half open
+            if self.breaker.state == "half_open":
+                self.breaker.record(False)
+            raise GatewayBusy()
+        self._count("in_flight")
+        self._count("calls")
+
+    def _release(self):
+        self._count("in_flight", -1)
+        self._slots.release()
+
+    def stream_reply(self, prompt):
+        """Yield tokens like LLMInterface.stream_reply, through the slot limit and breaker.
+
+        Raises GatewayBusy or CircuitOpen before the first token when the call
+        is not admitted.
+        """
+        self._admit()
+        started = time.monotonic()
+        recorded = False
+        try:
+            for token in self.llm.stream_reply(prompt):
+                if not recorded:
+                    recorded = True
+                    self.breaker.record(time.monotonic() - started <= self.slow_seconds)
+                yield token
+            if not recorded:
+                recorded = True
+                self.breaker.record(True)  # an empty reply still means Ollama answered
+        except GeneratorExit:
+            raise  # the client went away; says nothing about Ollama
+        except Exception:
+            self._count("failures")
+            if not recorded:
+                self.breaker.record(False)
+            raise
+        finally:
+            self._release()
+
+    def get_reply(self, prompt):
+        """Whole reply for prompt, or a fallback/busy message; never raises."""
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            shared = self._pending.get(key)
+            if shared is None:
+                future = self._pending[key] = Future()
+        if shared is not None:
+            self._count("coalesced")
+            try:
+                return shared.result(timeout=self.coalesce_timeout)
+            except FutureTimeout:
+                return BUSY_REPLY
+
+        reply = FALLBACK_REPLY  # what waiters get if the call dies with a BaseException
+        try:
+            reply = "".join(self.stream_reply(prompt)).strip()
+        except (GatewayBusy, CircuitOpen):
+            reply = BUSY_REPLY
+        except Exception as e:
+            print(f"❌ Ollama failed: {e}")
+            reply = FALLBACK_REPLY
+        finally:
+            with self._lock:
+                del self._pending[key]
+            future.set_result(reply)
+        return reply
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["breaker"] = self.breaker.state
+        return stats
@@ -2,38 +2,53 @@ import requests
 import json
 import os
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 load_dotenv()
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST")
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", 8))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", 120))  # max gap between streamed chunks
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # keeps the model and its prompt cache loaded
+
+FALLBACK_REPLY = "I couldn’t process that right now. Please try again."
+
+def make_session(pool_size=OLLAMA_POOL_SIZE):
+    """requests.Session with a keep-alive connection pool sized for the workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 class LLMInterface:
-    def __init__(self, ollama_model="llama3", host=OLLAMA_HOST):
+    def __init__(self, ollama_model="llama3", host=OLLAMA_HOST, session=None):
         self.model = ollama_model
         self.host = host
+        self.session = session or make_session()
 
-    def get_reply(self, prompt: str) -> str:
-        """Send prompt to Ollama and stream response."""
-        try:
-            response = requests.post(
-                f"{self.host}/api/generate",
-                json={"model": self.model, "prompt": prompt},
-                stream=True,
-                timeout=600
-            )
+    def stream_reply(self, prompt: str):
+        """Yield reply tokens as Ollama streams them. Errors propagate to the caller."""
+        with self.session.post(
+            f"{self.host}/api/generate",
+            json={"model": self.model, "prompt": prompt, "keep_alive": OLLAMA_KEEP_ALIVE},
+            stream=True,
+            timeout=(5, OLLAMA_READ_TIMEOUT)
+        ) as response:
             response.raise_for_status()
-            
-            full_reply = ""
             for line in response.iter_lines():
                 if not line:
                     continue
                 data = json.loads(line.decode("utf-8"))
-                if "response" in data:
-                    full_reply += data["response"]
+                if data.get("response"):
+                    yield data["response"]
                 if data.get("done"):
                     break
 
-            return full_reply.strip()
+    def get_reply(self, prompt: str) -> str:
+        """Send prompt to Ollama and return the whole streamed response."""
+        try:
+            return "".join(self.stream_reply(prompt)).strip()
         except Exception as e:
             print(f"❌ Ollama failed: {e}")
-            return "I couldn’t process that right now. Please try again."
+            return FALLBACK_REPLY
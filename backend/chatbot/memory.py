@@ -1,12 +1,149 @@
-from collections import deque
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from models import db, ChatMessage
+
+CHAT_MEMORY_BACKEND = os.getenv("CHAT_MEMORY_BACKEND", "memory")  # 'memory' or 'db'
+CHAT_MEMORY_MAX_CHARS = int(os.getenv("CHAT_MEMORY_MAX_CHARS", 4000))  # per conversation
+CHAT_MEMORY_MAX_USERS = int(os.getenv("CHAT_MEMORY_MAX_USERS", 1000))
+CHAT_MEMORY_TOTAL_CHARS = int(os.getenv("CHAT_MEMORY_TOTAL_CHARS", 2_000_000))  # across conversations
+CHAT_MEMORY_IDLE_SECONDS = int(os.getenv("CHAT_MEMORY_IDLE_SECONDS", 1800))
 
 class ConversationBufferMemory:
-    def __init__(self, max_turns=8):
-        self.buffer = deque(maxlen=max_turns)
+    """Recent turns of one conversation, trimmed oldest-first to a character budget."""
+
+    def __init__(self, max_chars=CHAT_MEMORY_MAX_CHARS):
+        self.max_chars = max_chars
+        self.buffer = deque()
+        self.chars = 0
 
     def update(self, role: str, text: str):
+        text = text[:self.max_chars]
         self.buffer.append({"role": role, "text": text})
+        self.chars += len(text)
+        while self.chars > self.max_chars:
+            self.chars -= len(self.buffer.popleft()["text"])
+
+    def get_messages(self):
+        return list(self.buffer)
 
     def get_context(self) -> str:
         context = "\n".join([f"{m['role'].capitalize()}: {m['text']}" for m in self.buffer])
         return context if context else "No prior context."
+
+class MemoryStore:
+    """Per-user conversations held in this process.
+
+    Least recently used conversations are evicted once there are more than
+    max_users of them or they hold more than max_total_chars together, and
+    a conversation idle for idle_seconds is forgotten.
+    """
+
+    def __init__(self, max_chars=CHAT_MEMORY_MAX_CHARS, max_users=CHAT_MEMORY_MAX_USERS,
+                 max_total_chars=CHAT_MEMORY_TOTAL_CHARS, idle_seconds=CHAT_MEMORY_IDLE_SECONDS):
+        self.max_chars = max_chars
+        self.max_users = max_users
+        self.max_total_chars = max_total_chars
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()  # user_id -> (last used, memory), least recent first
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def _session(self, user_id):
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._sessions.pop(user_id, None)
+        memory = entry[1] if entry else ConversationBufferMemory(self.max_chars)
+        self._sessions[user_id] = (now, memory)
+        return memory
+
+    def _drop_oldest(self):
+        _, (_, memory) = self._sessions.popitem(last=False)
+        self._total_chars -= memory.chars
+
+    def _expire(self, now):
+        while self._sessions:
+            last_used, _ = next(iter(self._sessions.values()))
+            if now - last_used <= self.idle_seconds:
+                break
+            self._drop_oldest()
+
+    def append(self, user_id, role: str, text: str):
+        with self._lock:
+            memory = self._session(user_id)
+            before = memory.chars
+            memory.update(role, text)
+            self._total_chars += memory.chars - before
+            # The conversation just used is last in order, so it is never evicted here
+            while len(self._sessions) > 1 and (
+                len(self._sessions) > self.max_users or self._total_chars > self.max_total_chars
+            ):
+                self._drop_oldest()
+
+    def get_context(self, user_id) -> str:
+        with self._lock:
+            return self._session(user_id).get_context()
+
+    def get_messages(self, user_id):
+        """Turns of the user's conversation, oldest first."""
+        with self._lock:
+            return self._session(user_id).get_messages()
+
+    def prune(self):
+        with self._lock:
+            before = len(self._sessions)
+            self._expire(time.monotonic())
+            return before - len(self._sessions)
+
+class DBMemoryStore:
+    """Per-user conversations kept in the chat_message table.
+
+    Survives restarts and is shared by every worker. Turns older than
+    idle_seconds no longer count as context and are removed by prune().
+    """
+
+    def __init__(self, max_chars=CHAT_MEMORY_MAX_CHARS, idle_seconds=CHAT_MEMORY_IDLE_SECONDS,
+                 max_messages=50):
+        self.max_chars = max_chars
+        self.idle_seconds = idle_seconds
+        self.max_messages = max_messages
+
+    def _cutoff(self):
+        return datetime.utcnow() - timedelta(seconds=self.idle_seconds)
+
+    def append(self, user_id, role: str, text: str):
+        db.session.add(ChatMessage(user_id=user_id, role=role, text=text[:self.max_chars]))
+        db.session.commit()
+
+    def _load(self, user_id):
+        rows = (
+            db.session.query(ChatMessage.role, ChatMessage.text)
+            .filter(ChatMessage.user_id == user_id, ChatMessage.created_at >= self._cutoff())
+            .order_by(ChatMessage.id.desc())
+            .limit(self.max_messages)
+            .all()
+        )
+        memory = ConversationBufferMemory(self.max_chars)
+        for role, text in reversed(rows):
+            memory.update(role, text)
+        return memory
+
+    def get_context(self, user_id) -> str:
+        return self._load(user_id).get_context()
+
+    def get_messages(self, user_id):
+        """Turns of the user's conversation, oldest first."""
+        return self._load(user_id).get_messages()
+
+    def prune(self):
+        deleted = ChatMessage.query.filter(ChatMessage.created_at < self._cutoff()).delete()
+        db.session.commit()
+        return deleted
+
+def make_memory_store(backend=CHAT_MEMORY_BACKEND):
+    if backend == "db":
+        return DBMemoryStore()
+    return MemoryStore()
@@ -0,0 +1,134 @@
+import os
+import threading
+
+LLM_PROMPT_BUDGET = int(os.getenv("LLM_PROMPT_BUDGET", 1500))  # tokens, question included
+MIN_QUESTION_TOKENS = 64  # room kept for the question even when the system prompt must shrink
+
+# Sent first and byte-for-byte identical on every request, so Ollama can
+# reuse its KV cache for this prefix instead of prefilling it again.
+SYSTEM_PROMPT = """You are FinMate, an intelligent personal finance assistant integrated into a user's expense tracker app.
+
+Goals:
+- Help users understand their spending habits.
+- Give budgeting, saving, and financial wellness advice.
+- Keep tone friendly, supportive, and practical.
+- Reference their expense data when useful.
+- Never reveal internal system details or raw JSON.
+
+Example abilities:
+- Summarize expenses by category.
+- Suggest areas to save money.
+- Encourage healthy financial habits.
+
+Keep responses concise and conversational.
+
+"""
+
+def estimate_tokens(text):
+    """Rough token count: about four characters per token for English text."""
+    return (len(text) + 3) // 4
+
+def _money(amount):
+    return f"₹{amount:,.0f}"
+
+def summarize_expenses(month_to_date, last_month, recent):
+    """Compact text summary of a user's spending: month-to-date totals per
+    category with the change against last month, then the latest expenses.
+    Lines are ordered by importance, so trimming from the end is safe."""
+    total, previous = sum(month_to_date.values()), sum(last_month.values())
+    if not month_to_date and not last_month:
+        lines = ["No spending recorded this month or last month."]
+    else:
+        lines = [f"Month to date: {_money(total)} (all of last month: {_money(previous)})"]
+        for category in sorted(month_to_date, key=month_to_date.get, reverse=True):
+            amount, before = month_to_date[category], last_month.get(category)
+            if before:
+                lines.append(f"- {category}: {_money(amount)} vs {_money(before)} ({(amount - before) / before:+.0%})")
+            else:
+                lines.append(f"- {category}: {_money(amount)} (none last month)")
+    if recent:
+        lines.append("Latest: " + "; ".join(
+            f"{e['date']} {e['description'] or e['category']} {_money(e['amount'])}" for e in recent
+        ))
+    return "\n".join(lines)
+
+class PromptBuilder:
+    """Assembles chat prompts within a token budget.
+
+    Layout: the static system prompt, the expense summary, as much of the
+    conversation as still fits (newest turns kept), then the question.
+    """
+
+    def __init__(self, budget=LLM_PROMPT_BUDGET, system_prompt=SYSTEM_PROMPT):
+        self.budget = budget
+        self.prefix = system_prompt
+        self.prefix_tokens = estimate_tokens(system_prompt)
+        self._lock = threading.Lock()
+        self._stats = {"prompts": 0, "total_tokens": 0, "max_tokens": 0, "dropped_turns": 0}
+        self._last = None
+
+    def build(self, user_input, history, summary):
+        """(prompt, token counts) for one question; history is oldest first.
+
+        Summary and memory only get what the question leaves. A budget too
+        small for the system prompt cuts the prompt down to keep
+        MIN_QUESTION_TOKENS for the question, and a question that still does
+        not fit is cut to the room left.
+        """
+        overhead = estimate_tokens("User: \nAssistant:")
+        prefix, prefix_tokens = self.prefix, self.prefix_tokens
+        if self.budget - prefix_tokens - overhead < MIN_QUESTION_TOKENS:
+            prefix = prefix[:max(self.budget - overhead - MIN_QUESTION_TOKENS, 0) * 4]
+            prefix_tokens = estimate_tokens(prefix)
+        room = self.budget - prefix_tokens - overhead
+        if estimate_tokens(user_input) > room:
+            user_input = user_input[:max(room * 4 - 1, 0)].rstrip() + "…" if room > 0 else ""
+        question = f"User: {user_input}\nAssistant:"
+        remaining = self.budget - prefix_tokens - estimate_tokens(question)
+
+        lines = summary.split("\n")
+        summary_block = ""
+        while lines:
+            summary_block = "--- Expense Summary ---\n" + "\n".join(lines) + "\n\n"
+            if estimate_tokens(summary_block) <= remaining:
+                break
+            lines.pop()
+            summary_block = ""
+        remaining -= estimate_tokens(summary_block)
+
+        turns = []
+        remaining -= estimate_tokens("--- Conversation ---\n\n\n")  # the block's header and spacing
+        for message in reversed(history):
+            turn = f"{message['role'].capitalize()}: {message['text']}"
+            cost = estimate_tokens(turn + "\n")
+            if cost > remaining:
+                break
+            turns.append(turn)
+            remaining -= cost
+        turns.reverse()
+        memory_block = "--- Conversation ---\n" + "\n".join(turns) + "\n\n" if turns else ""
+
+        prompt = prefix + summary_block + memory_block + question
+        tokens = {
+            "system": prefix_tokens,
+            "summary": estimate_tokens(summary_block),
+            "memory": estimate_tokens(memory_block),
+            "question": estimate_tokens(question),
+        }
+        tokens["total"] = sum(tokens.values())
+
+        with self._lock:
+            self._stats["prompts"] += 1
+            self._stats["total_tokens"] += tokens["total"]
+            self._stats["max_tokens"] = max(self._stats["max_tokens"], tokens["total"])
+            self._stats["dropped_turns"] += len(history) - len(turns)
+            self._last = tokens
+        return prompt, tokens
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_tokens"] = round(stats["total_tokens"] / stats["prompts"]) if stats["prompts"] else 0
+        stats["budget"] = self.budget
+        stats["last"] = self._last
+        return stats
@@ -1,55 +1,405 @@
 # services/finance_chatbot/query_engine.py
 
-from models import Expense
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from models import Expense, MonthlyCategoryTotal
+from sqlalchemy import extract, func
+from datetime import date, datetime, timedelta
+import os
 import re
 
+from cache import LRUCache, expense_versions
+
+# Bounds staleness for writes handled by another worker, see chatbot/storage.py
+CHAT_QUERY_TTL = int(os.getenv("CHAT_QUERY_TTL", 60))
+
+# Always recognised, even before a user has spent anything in them
+DEFAULT_CATEGORIES = ["food", "transport", "shopping", "health", "entertainment", "other"]
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+NUMBER = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+
+MONTH_NAMES = ["january", "february", "march", "april", "may", "june", "july",
+               "august", "september", "october", "november", "december"]
+MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+
+ISO_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+LAST_N = re.compile(r"\b(?:last|past|previous)\s+" + NUMBER + r"\s+(day|week|month|year)s?\b")
+MONTH_RANGE = re.compile(
+    r"\b(?:from|between)\s+" + MONTH + r"(?:\s+(\d{4}))?\s+(?:to|until|through|and|-)\s+" + MONTH + r"(?:\s+(\d{4}))?\b"
+)
+MONTH_WITH_YEAR = re.compile(r"\b" + MONTH + r"\s+(\d{4})\b")
+MONTH_ALONE = re.compile(r"\b(?:in|during|for|of|on)\s+" + MONTH + r"\b")
+TOP_N = re.compile(r"\btop\s+" + NUMBER + r"\b")
+
+# Routing: a spending verb, or a measuring phrase about a period or category
+SPENDING_VERB = re.compile(r"\b(spent|spend|spending|spends|expenses?|paid)\b")
+MEASURE = re.compile(r"\b(how much|total|compare|compared|vs|versus|top|most|biggest|break\s*down)\b")
+ADVICE = re.compile(r"\b(should|could|save|saving|savings|afford|tips?|advice|recommend|suggest)\b")
+VERSUS = re.compile(r"\s(?:vs\.?|versus|compared\s+(?:to|with)|against)\s")
+COMPARE_WITH = re.compile(r"\s(?:with|to|and)\s")
+
+def _number(word):
+    return int(word) if word.isdigit() else NUMBER_WORDS[word]
+
+def _month_number(name):
+    return next(i for i, full in enumerate(MONTH_NAMES, 1) if full.startswith(name[:3]))
+
+def _add_months(d, months):
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _month_index(d):
+    return d.year * 12 + d.month - 1
+
+def _recent_year(month, today):
+    """Year of the latest occurrence of month that is not in the future."""
+    return today.year if month <= today.month else today.year - 1
+
+def parse_period(text, today):
+    """(start, end, label) for the period a question mentions; end is exclusive.
+
+    start/end are dates, or None for an open end.
+    """
+    tomorrow = today + timedelta(days=1)
+    this_month = today.replace(day=1)
+
+    dates = []
+    for match in ISO_DATE.findall(text):
+        try:
+            dates.append(date.fromisoformat(match))
+        except ValueError:
+            pass
+    if len(dates) >= 2:
+        first, last = sorted(dates[:2])
+        return first, last + timedelta(days=1), f"between {first} and {last}"
+    if dates:
+        day = dates[0]
+        if re.search(r"\b(since|after|from)\s+\d{4}-", text):
+            return day, tomorrow, f"since {day}"
+        if re.search(r"\b(before|until|till)\s+\d{4}-", text):
+            return None, day, f"before {day}"
+        return day, day + timedelta(days=1), f"on {day}"
+
+    match = LAST_N.search(text)
+    if match:
+        n, unit = _number(match.group(1)), match.group(2)
+        plural = f"{n} {unit}s" if n != 1 else unit
+        if unit == "day":
+            return tomorrow - timedelta(days=n), tomorrow, f"in the last {plural}"
+        if unit == "week":
+            return tomorrow - timedelta(weeks=n), tomorrow, f"in the last {plural}"
+        if unit == "month":
+            # Calendar months, the current one included
+            return _add_months(this_month, -(n - 1)), tomorrow, f"in the last {plural}"
+        return date(today.year - n + 1, 1, 1), tomorrow, f"in the last {plural}"
+
+    match = MONTH_RANGE.search(text)
+    if match:
+        first_month, first_year = _month_number(match.group(1)), match.group(2)
+        last_month, last_year = _month_number(match.group(3)), match.group(4)
+        if first_year:
+            first_year = int(first_year)
+        elif last_year:
+            first_year = int(last_year) - (1 if first_month > last_month else 0)
+        else:
+            first_year = _recent_year(first_month, today)
+        last_year = int(last_year) if last_year else first_year + (1 if last_month < first_month else 0)
+        start, last = date(first_year, first_month, 1), date(last_year, last_month, 1)
+        return start, _add_months(last, 1), (
+            f"from {MONTH_NAMES[first_month - 1].capitalize()} {first_year} "
+            f"to {MONTH_NAMES[last_month - 1].capitalize()} {last_year}"
+        )
+
+    match = MONTH_WITH_YEAR.search(text)
+    month, year = (_month_number(match.group(1)), int(match.group(2))) if match else (None, None)
+    if month is None:
+        match = MONTH_ALONE.search(text)
+        if match:
+            month = _month_number(match.group(1))
+            year = _recent_year(month, today)
+    if month is not None:
+        start = date(year, month, 1)
+        return start, _add_months(start, 1), f"in {MONTH_NAMES[month - 1].capitalize()} {year}"
+
+    if "today" in text:
+        return today, tomorrow, "today"
+    if "yesterday" in text:
+        return today - timedelta(days=1), today, "yesterday"
+    if "last month" in text:
+        return _add_months(this_month, -1), this_month, "last month"
+    if "this month" in text:
+        return this_month, tomorrow, "this month"
+    if "last week" in text:
+        monday = today - timedelta(days=today.weekday())
+        return monday - timedelta(weeks=1), monday, "last week"
+    if "week" in text:
+        return today - timedelta(days=7), tomorrow, "this week"
+    if "last year" in text:
+        return date(today.year - 1, 1, 1), date(today.year, 1, 1), "last year"
+    if "this year" in text:
+        return date(today.year, 1, 1), tomorrow, "this year"
+    return None, None, "overall"
+
+def parse_compared_periods(text, today):
+    """Two (start, end, label) periods for "this month vs last month" style
+    questions, or None when the text does not set two different periods
+    against each other."""
+    parts = VERSUS.split(text, maxsplit=1)
+    if len(parts) < 2 and re.search(r"\bcompare\b", text):
+        parts = COMPARE_WITH.split(text, maxsplit=1)
+    if len(parts) < 2:
+        return None
+    first, second = parse_period(parts[0], today), parse_period(parts[1], today)
+    if "overall" in (first[2], second[2]) or first[:2] == second[:2]:
+        return None
+    return first, second
+
+def parse_categories(text, known):
+    """Known categories mentioned in text, in the order they appear."""
+    found = []
+    for category in known:
+        match = re.search(r"\b" + re.escape(category) + r"s?\b", text)
+        if match:
+            found.append((match.start(), category))
+    return [category for _, category in sorted(found)]
+
+def parse_intent(text, categories, start, end):
+    """(intent, top_n, by_month), intent being 'total', 'breakdown', 'compare' or 'top'."""
+    by_month = bool(re.search(r"\b(by|per|each|every) month\b|\bmonthly\b|\bmonth by month\b|\btrend\b", text))
+
+    match = TOP_N.search(text)
+    if match:
+        return "top", _number(match.group(1)), by_month
+    if re.search(r"\btop\b", text):
+        return "top", 3, by_month
+    if re.search(r"\b(most|biggest|largest|highest)\b", text) and len(categories) != 1:
+        return "top", 1, by_month
+
+    if re.search(r"\b(compare|compared|comparison|versus|vs\.?)\b", text):
+        spans_months = start is not None and end is not None and _month_index(end - timedelta(days=1)) > _month_index(start)
+        if len(categories) < 2 and spans_months:
+            by_month = True
+        return "compare", None, by_month
+    if re.search(r"\bbreak\s*down\b|\b(by|per|each) category\b|\bcategories\b", text):
+        return "breakdown", None, by_month
+    return "total", None, by_month
+
+class SpendingQuery:
+    """A parsed spending question: a [start, end) date range, categories and an intent."""
+
+    def __init__(self, start, end, label, categories, intent, top_n=None, by_month=False):
+        self.start = start
+        self.end = end
+        self.label = label
+        self.categories = categories
+        self.intent = intent
+        self.top_n = top_n
+        self.by_month = by_month
+        self.versus = None  # the other SpendingQuery of a two-period comparison
+
+    def key(self):
+        return (self.start, self.end, tuple(self.categories), self.by_month)
+
+def _money(amount):
+    return f"₹{amount:.2f}"
+
+def _join(words):
+    return words[0] if len(words) == 1 else ", ".join(words[:-1]) + " and " + words[-1]
+
 class QueryEngine:
     def __init__(self, db):
         self.db = db
+        self._categories = LRUCache(1024, ttl=CHAT_QUERY_TTL)
+        self._results = LRUCache(4096, ttl=CHAT_QUERY_TTL)
 
-    def parse_query(self, user_input: str, user_id: int):
-        """Detect query intent and fetch relevant expense data."""
+    def user_categories(self, user_id):
+        """The user's own categories (lowercased) plus the defaults, cached until their data changes."""
+        version = expense_versions.get(user_id)
+        entry = self._categories.get(user_id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        rows = (
+            self.db.session.query(func.lower(MonthlyCategoryTotal.category))
+            .filter(MonthlyCategoryTotal.user_id == user_id, MonthlyCategoryTotal.count > 0)
+            .distinct()
+            .all()
+        )
+        known = {category for (category,) in rows if category} | set(DEFAULT_CATEGORIES)
+        # Longest first, so "food delivery" wins over "food"
+        known = sorted(known, key=len, reverse=True)
+        self._categories.set(user_id, (version, known))
+        return known
+
+    def parse(self, user_input, user_id, today=None):
         text = user_input.lower()
+        today = today or datetime.utcnow().date()
+        start, end, label = parse_period(text, today)
+        categories = parse_categories(text, self.user_categories(user_id))
+        # Drop categories contained in a longer one that was also matched
+        categories = [c for c in categories if not any(c != o and c in o for o in categories)]
+        periods = parse_compared_periods(text, today)
+        if periods:
+            (start, end, label), other = periods
+            query = SpendingQuery(start, end, label, categories, "compare")
+            query.versus = SpendingQuery(*other, categories, "compare")
+            return query
+        intent, top_n, by_month = parse_intent(text, categories, start, end)
+        return SpendingQuery(start, end, label, categories, intent, top_n, by_month)
 
-        # --- Detect time period ---
-        now = datetime.utcnow()
-        start_date, end_date = None, None
-
-        if "this month" in text:
-            start_date = datetime(now.year, now.month, 1)
-            end_date = now
-        elif "last month" in text:
-            first_of_this_month = datetime(now.year, now.month, 1)
-            last_month_end = first_of_this_month - timedelta(days=1)
-            start_date = datetime(last_month_end.year, last_month_end.month, 1)
-            end_date = last_month_end
-        elif "week" in text:
-            start_date = now - timedelta(days=7)
-            end_date = now
-
-        # --- Detect category ---
-        categories = ["food", "transport", "shopping", "health", "entertainment", "other"]
-        category = next((c for c in categories if c in text), None)
-
-        # --- Run appropriate query ---
-        query = self.db.session.query(func.sum(Expense.amount)).filter_by(user_id=user_id)
-        if start_date and end_date:
-            query = query.filter(Expense.ds >= start_date, Expense.ds <= end_date)
-        if category:
-            query = query.filter(func.lower(Expense.category) == category.lower())
-
-        total = query.scalar() or 0
-
-        # --- Generate readable response ---
-        time_label = (
-            "this month" if "this month" in text else
-            "last month" if "last month" in text else
-            "this week" if "week" in text else "overall"
+    def match(self, user_input, user_id):
+        """The parsed query when user_input asks about the user's own spending, else None.
+
+        Advice questions ("how much should I save") are left to the LLM even
+        when they mention a period or category.
+        """
+        text = user_input.lower()
+        if ADVICE.search(text):
+            return None
+        verb = SPENDING_VERB.search(text)
+        if not verb and not MEASURE.search(text):
+            return None
+        query = self.parse(user_input, user_id)
+        if verb or query.label != "overall" or query.categories:
+            return query
+        return None
+
+    def totals(self, query, user_id):
+        """[(category, (year, month) or None, total)] for a parsed question, in one grouped query.
+
+        Ranges made of whole months (the current month to date included) are
+        summed from the monthly rollup; anything else from the expense rows.
+        Results are cached until the user's expenses change.
+        """
+        cache_key = (user_id, expense_versions.get(user_id), query.key())
+        cached = self._results.get(cache_key)
+        if cached is not None:
+            return cached
+
+        today = datetime.utcnow().date()
+        whole_months = (
+            (query.start is None or query.start.day == 1)
+            and (query.end is None or query.end.day == 1 or query.end > today)
         )
+        if whole_months:
+            source = MonthlyCategoryTotal
+            category = func.lower(MonthlyCategoryTotal.category)
+            year, month = MonthlyCategoryTotal.year, MonthlyCategoryTotal.month
+            total = func.sum(MonthlyCategoryTotal.total)
+        else:
+            source = Expense
+            category = func.lower(func.coalesce(Expense.category, ''))
+            year, month = extract('year', Expense.ds), extract('month', Expense.ds)
+            total = func.sum(Expense.amount)
+
+        columns = [category, year, month] if query.by_month else [category]
+        sql = self.db.session.query(*columns, total).filter(source.user_id == user_id)
 
-        if category:
-            return f"You spent ₹{total:.2f} on {category} {time_label}."
+        if whole_months:
+            month_index = MonthlyCategoryTotal.year * 12 + MonthlyCategoryTotal.month - 1
+            if query.start:
+                sql = sql.filter(month_index >= _month_index(query.start))
+            if query.end:
+                last = _month_index(query.end) if query.end.day == 1 else _month_index(query.end) + 1
+                sql = sql.filter(month_index < last)
         else:
-            return f"You spent ₹{total:.2f} in total {time_label}."
+            if query.start:
+                sql = sql.filter(Expense.ds >= datetime.combine(query.start, datetime.min.time()))
+            if query.end:
+                sql = sql.filter(Expense.ds < datetime.combine(query.end, datetime.min.time()))
+        if query.categories:
+            sql = sql.filter(category.in_(query.categories))
+
+        rows = sql.group_by(*columns).all()
+        if query.by_month:
+            result = [(c, (int(y), int(m)), float(t or 0)) for c, y, m, t in rows]
+        else:
+            result = [(c, None, float(t or 0)) for c, t in rows]
+        self._results.set(cache_key, result)
+        return result
+
+    def parse_query(self, user_input: str, user_id: int):
+        """Answer a spending question with one grouped query."""
+        return self.answer(self.parse(user_input, user_id), user_id)
+
+    def answer(self, query, user_id):
+        """Answer a parsed query; a two-period comparison runs one grouped query per period."""
+        if query.versus is not None:
+            return self.format_comparison(query, self.totals(query, user_id), self.totals(query.versus, user_id))
+        return self.format_answer(query, self.totals(query, user_id))
+
+    @staticmethod
+    def _by_category(query, rows):
+        by_category = {}
+        for category, _, total in rows:
+            name = category or "uncategorized"
+            by_category[name] = by_category.get(name, 0) + total
+        for category in query.categories:
+            by_category.setdefault(category, 0.0)
+        return by_category
+
+    def format_comparison(self, query, rows, other_rows):
+        current, other = self._by_category(query, rows), self._by_category(query.versus, other_rows)
+        total, other_total = sum(current.values()), sum(other.values())
+        subject = f" on {_join(query.categories)}" if query.categories else ""
+        answer = f"You spent {_money(total)}{subject} {query.label} and {_money(other_total)} {query.versus.label}"
+        difference = total - other_total
+        if difference:
+            answer += f", {_money(abs(difference))} {'more' if difference > 0 else 'less'} {query.label}."
+        else:
+            answer += ", the same amount."
+        if len(query.categories) > 1:
+            parts = [f"{c} {_money(current[c])} vs {_money(other[c])}" for c in query.categories]
+            answer += " By category: " + ", ".join(parts) + "."
+        return answer
+
+    def format_answer(self, query, rows):
+        label = query.label
+        by_category = self._by_category(query, rows)
+        ranked = sorted(by_category.items(), key=lambda item: item[1], reverse=True)
+        grand_total = sum(by_category.values())
+
+        if query.by_month:
+            months = {}
+            for category, (year, month), total in rows:
+                months.setdefault((year, month), {})
+                name = category or "uncategorized"
+                months[(year, month)][name] = months[(year, month)].get(name, 0) + total
+            if not months:
+                return f"No spending found {label}."
+            lines = []
+            for (year, month), totals in sorted(months.items()):
+                name = f"{MONTH_NAMES[month - 1].capitalize()[:3]} {year}"
+                if query.categories and len(query.categories) > 1:
+                    parts = [f"{c} {_money(totals.get(c, 0))}" for c in query.categories]
+                    lines.append(f"- {name}: " + ", ".join(parts))
+                else:
+                    lines.append(f"- {name}: {_money(sum(totals.values()))}")
+            subject = f" on {_join(query.categories)}" if query.categories else ""
+            return f"Month by month{subject} {label}:\n" + "\n".join(lines)
+
+        if query.intent == "top":
+            top = [(c, t) for c, t in ranked if t > 0][:query.top_n]
+            if not top:
+                return f"No spending found {label}."
+            if query.top_n == 1:
+                category, total = top[0]
+                return f"You spent the most on {category} {label}: {_money(total)}."
+            parts = [f"{i}. {c} {_money(t)}" for i, (c, t) in enumerate(top, 1)]
+            return f"Your top {len(top)} categories {label}: " + ", ".join(parts) + "."
+
+        if query.intent in ("compare", "breakdown") or len(query.categories) > 1:
+            if not ranked:
+                return f"No spending found {label}."
+            parts = ", ".join(f"{c} {_money(t)}" for c, t in ranked)
+            answer = f"You spent {_money(grand_total)} {label}: {parts}."
+            if query.intent == "compare" and len(ranked) >= 2:
+                (first, a), (second, b) = ranked[0], ranked[1]
+                answer += f" That's {_money(a - b)} more on {first} than on {second}."
+            return answer
+
+        if query.categories:
+            return f"You spent {_money(grand_total)} on {query.categories[0]} {label}."
+        return f"You spent {_money(grand_total)} in total {label}."
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from cache import LRUCache
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 24 * 3600))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 1024))  # entries kept in memory
+LLM_CACHE_DISK_SIZE = int(os.getenv("LLM_CACHE_DISK_SIZE", 20000))  # entries kept on disk
+# Shared by every worker on the host; set to an empty string to keep the cache in memory only.
+# Defaults to the Flask instance folder, which only the app user can read.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "finmate_llm_cache.sqlite"
+))
+
+def normalize_prompt(text):
+    """Lowercase, drop punctuation and collapse whitespace, so trivial rewordings share an entry."""
+    text = re.sub(r"[^\w\s₹]", " ", text.lower())
+    return " ".join(text.split())
+
+def data_version(data):
+    """Content hash of the data a prompt was built from; identical on every worker."""
+    encoded = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+class ResponseCache:
+    """LLM replies keyed on (model, user, normalized question, data version, context),
+    context being the previous exchange for follow-up questions and empty otherwise.
+
+    A small in-process LRU sits in front of a SQLite file. Entries expire
+    after ttl seconds and the file is trimmed to disk_size entries, least
+    recently used first.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, size=LLM_CACHE_SIZE,
+                 disk_size=LLM_CACHE_DISK_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.disk_size = disk_size
+        self._memory = LRUCache(size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        if self.path:
+            # Replies quote users' spending: keep the file private to the app user
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_response ("
+                    "key TEXT PRIMARY KEY, reply TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_response_last_used ON llm_response (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        """One transaction on a fresh connection, closed afterwards."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model, user_id, question, version, context=""):
+        raw = "\x1f".join([model, str(user_id), normalize_prompt(question), version, context])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get(self, key):
+        reply = self._memory.get(key)
+        if reply is not None:
+            self._count("hits")
+            self._count("memory_hits")
+            return reply
+
+        if self.path:
+            now = time.time()
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        "SELECT reply FROM llm_response WHERE key = ? AND created_at >= ?",
+                        (key, now - self.ttl)
+                    ).fetchone()
+                    if row:
+                        conn.execute("UPDATE llm_response SET last_used = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                print("[ERROR] LLM cache read failed:", e)
+                row = None
+            if row:
+                self._memory.set(key, row[0])
+                self._count("hits")
+                self._count("disk_hits")
+                return row[0]
+
+        self._count("misses")
+        return None
+
+    def set(self, key, reply):
+        self._memory.set(key, reply)
+        self._count("stores")
+        if not self.path:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % 100 == 0
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_response (key, reply, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, reply, now, now)
+                )
+                if trim:
+                    conn.execute("DELETE FROM llm_response WHERE created_at < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM llm_response WHERE key IN ("
+                        "SELECT key FROM llm_response ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.disk_size,)
+                    )
+        except sqlite3.Error as e:
+            print("[ERROR] LLM cache write failed:", e)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["memory_entries"] = len(self._memory)
+        return stats
@@ -1,10 +1,65 @@
-from models import Expense
+import os
+from datetime import datetime, timedelta
+
+from cache import LRUCache, expense_versions
+from models import db, Expense
+from rollup import category_totals
+from chatbot.prompt_builder import summarize_expenses
+
+# Writes handled by another worker only bump that worker's version, so
+# snapshots also expire after this many seconds.
+CHAT_CONTEXT_TTL = int(os.getenv("CHAT_CONTEXT_TTL", 60))
 
 class Storage:
-    def get_recent_expenses(self, limit=5):
-        """Fetch latest expenses for context."""
-        expenses = Expense.query.order_by(Expense.ds.desc()).limit(limit).all()
+    """Compact per-user expense snapshot for chat prompts.
+
+    Cached per user until their expenses change, so a prompt normally costs
+    no queries at all.
+    """
+
+    def __init__(self, maxsize=1024, ttl=CHAT_CONTEXT_TTL):
+        self._snapshots = LRUCache(maxsize, ttl=ttl)
+
+    def get_expense_context(self, user_id, limit=5):
+        """{"recent", "month_to_date", "last_month", "summary"} for one user.
+
+        summary is the prompt-ready rendering of the other three.
+        """
+        version = expense_versions.get(user_id)
+        entry = self._snapshots.get((user_id, limit))
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        now = datetime.utcnow()
+        last_month = now.replace(day=1) - timedelta(days=1)
+        snapshot = {
+            "recent": self.get_recent_expenses(user_id, limit),
+            "month_to_date": self._category_totals(user_id, now.year, now.month),
+            "last_month": self._category_totals(user_id, last_month.year, last_month.month),
+        }
+        snapshot["summary"] = summarize_expenses(
+            snapshot["month_to_date"], snapshot["last_month"], snapshot["recent"]
+        )
+        self._snapshots.set((user_id, limit), (version, snapshot))
+        return snapshot
+
+    def _category_totals(self, user_id, year, month):
+        return {
+            category or "Uncategorized": round(total, 2)
+            for category, total in category_totals(user_id, year, month).items()
+        }
+
+    def get_recent_expenses(self, user_id, limit=5):
+        """Latest expenses of one user, served by ix_expense_user_id_ds."""
+        rows = (
+            db.session.query(Expense.ds, Expense.description, Expense.amount, Expense.category)
+            .filter(Expense.user_id == user_id)
+            .order_by(Expense.ds.desc())
+            .limit(limit)
+            .all()
+        )
         return [
-            {"description": e.description, "amount": e.amount, "category": e.category}
-            for e in expenses
+            {"date": ds.date().isoformat(), "description": description,
+             "amount": round(amount, 2), "category": category}
+            for ds, description, amount, category in rows
         ]
@@ -0,0 +1,268 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from cache import LRUCache
+from models import db, Expense, ForecastResult
+
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", 256))
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", 2))
+FORECAST_MAX_PENDING = int(os.getenv("FORECAST_MAX_PENDING", 32))
+FORECAST_JOB_TTL = 600  # seconds a finished job stays in memory; older queued records are abandoned
+
+
+def expense_fingerprint(user_id):
+    """Summarise a user's expenses as (count, max id, total, last date).
+
+    Any insert, delete or amount change moves at least one of these values,
+    so a cached forecast is only reused while its input data is unchanged.
+    """
+    count, max_id, total, last_ds = db.session.query(
+        func.count(Expense.id),
+        func.max(Expense.id),
+        func.sum(Expense.amount),
+        func.max(Expense.ds),
+    ).filter(Expense.user_id == user_id).one()
+    return (count, max_id, float(total or 0), last_ds)
+
+
+class ForecastCache:
+    """Per-user forecast results, tagged with the fingerprint they were fitted on."""
+
+    def __init__(self, maxsize=FORECAST_CACHE_SIZE):
+        self._entries = LRUCache(maxsize)
+
+    def get(self, user_id, fingerprint):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        return entry[1]
+
+    def set(self, user_id, fingerprint, forecast):
+        self._entries.set(user_id, (fingerprint, forecast))
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id)
+
+
+forecast_cache = ForecastCache()
+
+
+def daily_frame(df):
+    """Collapse a ds/y frame to one row per calendar day, zero-filling gaps.
+
+    Prophet then trains on history length rather than on the number of
+    individual expenses.
+    """
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame(columns=['ds', 'y'])
+
+    ds = pd.to_datetime(df['ds']).dt.normalize()
+    totals = df['y'].astype(float).groupby(ds).sum()
+    days = pd.date_range(totals.index.min(), totals.index.max(), freq='D')
+    totals = totals.reindex(days, fill_value=0.0)
+    return pd.DataFrame({'ds': days, 'y': totals.to_numpy()})
+
+
+def daily_expense_series(user_id):
+    """Load a user's daily spending totals, summed in SQL, as a ds/y frame."""
+    import pandas as pd
+
+    day = func.date(Expense.ds)
+    rows = (
+        db.session.query(day, func.sum(Expense.amount))
+        .filter(Expense.user_id == user_id)
+        .group_by(day)
+        .order_by(day)
+        .all()
+    )
+    return daily_frame(pd.DataFrame(rows, columns=['ds', 'y']))
+
+
+def fit_forecast(df, periods=30):
+    """Fit Prophet on a ds/y frame and return the forecast as JSON-ready records."""
+    from prophet import Prophet  # heavy; only worker processes and /predict pay for it
+
+    df = df.copy()
+    df['floor'] = 0
+
+    model = Prophet()
+    model.fit(df)
+
+    future = model.make_future_dataframe(periods=periods)
+    future['floor'] = 0
+    forecast = model.predict(future)
+    return forecast[['ds', 'yhat']].to_dict(orient='records')
+
+
+class ForecastQueueFull(Exception):
+    pass
+
+
+class ForecastJob:
+    def __init__(self, job_id, user_id, fingerprint, future):
+        self.id = job_id
+        self.user_id = user_id
+        self.fingerprint = fingerprint
+        self.future = future
+        self.created = time.time()
+
+    @property
+    def state(self):
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        return "failed" if self.future.exception() else "done"
+
+    def wait(self, timeout):
+        try:
+            self.future.result(timeout=timeout)
+        except TimeoutError:
+            pass
+        except Exception:
+            pass  # reported through state
+        return self.state
+
+
+def fingerprint_key(fingerprint):
+    return json.dumps(fingerprint, default=str)
+
+
+class ForecastJobs:
+    """Runs Prophet fits in a bounded process pool, off the request thread.
+
+    Every job is also recorded in the forecast_result table, so a poll can
+    land on any worker and a finished fit is reused by all of them. Within
+    this process at most one job per user is in flight for the same data,
+    and across workers a queued record for the same data is reused instead
+    of queueing another fit.
+    """
+
+    def __init__(self, max_workers=FORECAST_WORKERS, max_pending=FORECAST_MAX_PENDING, app=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.app = app
+        self._executor = None
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self._in_flight = {}  # user_id -> job id
+
+    def init_app(self, app):
+        self.app = app
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def queue_depth(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def find(self, user_id, fingerprint):
+        """The shared record for this user's current data, from any worker.
+
+        A queued record older than FORECAST_JOB_TTL belonged to a worker that
+        went away and is ignored, as are failed ones.
+        """
+        record = (
+            ForecastResult.query
+            .filter_by(user_id=user_id, fingerprint=fingerprint_key(fingerprint))
+            .order_by(ForecastResult.created_at.desc())
+            .first()
+        )
+        if record is None or record.state == "failed" or self.is_stale(record):
+            return None
+        return record
+
+    @staticmethod
+    def is_stale(record):
+        cutoff = datetime.utcnow() - timedelta(seconds=FORECAST_JOB_TTL)
+        return record.state == "queued" and record.created_at < cutoff
+
+    @staticmethod
+    def result(record):
+        return json.loads(record.forecast)
+
+    def submit(self, user_id, fingerprint, df, periods=30):
+        with self._lock:
+            self._prune()
+
+            job = self._jobs.get(self._in_flight.get(user_id))
+            if job and not job.future.done() and job.fingerprint == fingerprint:
+                return job.id
+
+            if self.queue_depth() >= self.max_pending:
+                raise ForecastQueueFull()
+
+            # Record first, so the job can be polled through any worker;
+            # records for this user's older data are no longer useful
+            job_id = uuid.uuid4().hex
+            key = fingerprint_key(fingerprint)
+            ForecastResult.query.filter(
+                ForecastResult.user_id == user_id, ForecastResult.fingerprint != key
+            ).delete(synchronize_session=False)
+            db.session.add(ForecastResult(id=job_id, user_id=user_id, fingerprint=key, state="queued"))
+            db.session.commit()
+
+            future = self._get_executor().submit(fit_forecast, df, periods)
+            job = ForecastJob(job_id, user_id, fingerprint, future)
+            self._jobs[job.id] = job
+            self._in_flight[user_id] = job.id
+
+        future.add_done_callback(lambda f, job=job: self._finish(job))
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _finish(self, job):
+        with self._lock:
+            if self._in_flight.get(job.user_id) == job.id:
+                del self._in_flight[job.user_id]
+
+        error = job.future.exception()
+        if error is None:
+            forecast_cache.set(job.user_id, job.fingerprint, job.future.result())
+        else:
+            print("[ERROR] forecast job failed:", error)
+
+        if self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                record = db.session.get(ForecastResult, job.id)
+                if record is None:
+                    return
+                if error is None:
+                    record.state = "done"
+                    # Flask's JSON provider, so the stored result reads back as /predict returns it
+                    record.forecast = self.app.json.dumps(job.future.result())
+                else:
+                    record.state = "failed"
+                    record.error = str(error)
+                record.finished_at = datetime.utcnow()
+                db.session.commit()
+        except Exception as e:
+            print("[ERROR] saving forecast job failed:", e)
+
+    def _prune(self):
+        cutoff = time.time() - FORECAST_JOB_TTL
+        for job_id, job in list(self._jobs.items()):
+            if job.future.done() and job.created < cutoff:
+                del self._jobs[job_id]
+
+
+forecast_jobs = ForecastJobs()
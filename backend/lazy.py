@@ -0,0 +1,64 @@
+import threading
+import time
+
+# name -> LazyResource, for warm_up() and the readiness check
+resources = {}
+
+
+class LazyResource:
+    """A heavy object (model, client, background service) built on first use.
+
+    get() is safe to call from many threads at once: the factory runs a
+    single time and everyone else waits for its result. A factory that
+    raises is retried on the next get().
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.error = None
+        self.load_seconds = None
+        resources[name] = self
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_seconds = time.perf_counter() - started
+                self.error = None
+                self._loaded = True
+        return self._value
+
+    def status(self):
+        return {
+            "loaded": self._loaded,
+            "load_ms": round(self.load_seconds * 1000) if self.load_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+def warm_up(names=None):
+    """Load the named resources (all by default) now; returns {name: error or None}."""
+    errors = {}
+    for name in names or list(resources):
+        try:
+            resources[name].get()
+            errors[name] = None
+        except Exception as e:
+            print(f"[ERROR] warm-up of {name} failed:", e)
+            errors[name] = str(e)
+    return errors
@@ -0,0 +1,48 @@
+"""Audit snapshot
+
+Revision ID: a7d4e9b2c318
+Revises: f8c3d6e0a417
+Create Date: 2026-10-18 17:02:14.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e9b2c318'
+down_revision = 'f8c3d6e0a417'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense_audit', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('group_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('description', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('expense_ds', sa.DateTime(), nullable=True))
+        batch_op.drop_constraint('expense_audit_expense_id_fkey', type_='foreignkey')
+        batch_op.create_index('ix_expense_audit_group_id_timestamp', ['group_id', 'timestamp', 'id'], unique=False)
+
+    # Backfill the snapshot from the expenses that still exist
+    op.execute("""
+        UPDATE expense_audit SET
+            group_id = (SELECT e.group_id FROM expense e WHERE e.id = expense_audit.expense_id),
+            amount = (SELECT e.amount FROM expense e WHERE e.id = expense_audit.expense_id),
+            description = (SELECT e.description FROM expense e WHERE e.id = expense_audit.expense_id),
+            expense_ds = (SELECT e.ds FROM expense e WHERE e.id = expense_audit.expense_id)
+    """)
+
+
+def downgrade():
+    # Entries of deleted expenses cannot satisfy the restored foreign key
+    op.execute("DELETE FROM expense_audit WHERE expense_id NOT IN (SELECT id FROM expense)")
+
+    with op.batch_alter_table('expense_audit', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_audit_group_id_timestamp')
+        batch_op.create_foreign_key('expense_audit_expense_id_fkey', 'expense', ['expense_id'], ['id'])
+        batch_op.drop_column('expense_ds')
+        batch_op.drop_column('description')
+        batch_op.drop_column('amount')
+        batch_op.drop_column('group_id')
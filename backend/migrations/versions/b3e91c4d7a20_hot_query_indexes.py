@@ -0,0 +1,65 @@
+"""Hot query indexes
+
+Revision ID: b3e91c4d7a20
+Revises: 379d95400111
+Create Date: 2026-10-18 10:12:41.518305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e91c4d7a20'
+down_revision = '379d95400111'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app already treats these as unique; drop any duplicates left by
+    # concurrent requests (keeping the oldest row) before enforcing it.
+    op.execute(
+        'DELETE FROM group_membership WHERE id NOT IN '
+        '(SELECT MIN(id) FROM group_membership GROUP BY group_id, user_id)'
+    )
+    op.execute(
+        'DELETE FROM budget WHERE id NOT IN '
+        '(SELECT MIN(id) FROM budget GROUP BY user_id, category)'
+    )
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_user_id_ds', ['user_id', 'ds'], unique=False)
+        batch_op.create_index('ix_expense_group_id', ['group_id'], unique=False)
+
+    with op.batch_alter_table('group_membership', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_group_membership_group_user', ['group_id', 'user_id'])
+        batch_op.create_index('ix_group_membership_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('expense_audit', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_audit_expense_id', ['expense_id'], unique=False)
+
+    with op.batch_alter_table('budget', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_budget_user_category', ['user_id', 'category'])
+
+    with op.batch_alter_table('rule', schema=None) as batch_op:
+        batch_op.create_index('ix_rule_user_id', ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('rule', schema=None) as batch_op:
+        batch_op.drop_index('ix_rule_user_id')
+
+    with op.batch_alter_table('budget', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_budget_user_category', type_='unique')
+
+    with op.batch_alter_table('expense_audit', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_audit_expense_id')
+
+    with op.batch_alter_table('group_membership', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_membership_user_id')
+        batch_op.drop_constraint('uq_group_membership_group_user', type_='unique')
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_group_id')
+        batch_op.drop_index('ix_expense_user_id_ds')
@@ -0,0 +1,39 @@
+"""Chat message
+
+Revision ID: b9e1f3a6d752
+Revises: a7d4e9b2c318
+Create Date: 2026-10-18 17:40:31.527964
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e1f3a6d752'
+down_revision = 'a7d4e9b2c318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('chat_message',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=20), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_message_user_id_id', ['user_id', 'id'], unique=False)
+        batch_op.create_index('ix_chat_message_created_at', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_message_created_at')
+        batch_op.drop_index('ix_chat_message_user_id_id')
+
+    op.drop_table('chat_message')
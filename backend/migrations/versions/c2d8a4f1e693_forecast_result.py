@@ -0,0 +1,40 @@
+"""Forecast result
+
+Revision ID: c2d8a4f1e693
+Revises: b9e1f3a6d752
+Create Date: 2026-10-18 19:12:44.306182
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d8a4f1e693'
+down_revision = 'b9e1f3a6d752'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('forecast_result',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('fingerprint', sa.String(length=255), nullable=False),
+    sa.Column('state', sa.String(length=20), nullable=False),
+    sa.Column('forecast', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('forecast_result', schema=None) as batch_op:
+        batch_op.create_index('ix_forecast_result_user_id_fingerprint', ['user_id', 'fingerprint'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('forecast_result', schema=None) as batch_op:
+        batch_op.drop_index('ix_forecast_result_user_id_fingerprint')
+
+    op.drop_table('forecast_result')
@@ -0,0 +1,43 @@
+"""Monthly category total rollup
+
+Revision ID: d41f7a9e2c83
+Revises: b3e91c4d7a20
+Create Date: 2026-10-18 11:02:17.334820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f7a9e2c83'
+down_revision = 'b3e91c4d7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('monthly_category_total',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year', 'month', 'category', name='uq_monthly_category_total')
+    )
+    # Backfill from existing expenses; `flask rebuild-rollups` does the same later on.
+    op.execute(
+        "INSERT INTO monthly_category_total (user_id, year, month, category, total, count) "
+        "SELECT user_id, CAST(EXTRACT(YEAR FROM ds) AS INTEGER), CAST(EXTRACT(MONTH FROM ds) AS INTEGER), "
+        "TRIM(COALESCE(category, '')), SUM(amount), COUNT(id) "
+        "FROM expense GROUP BY user_id, CAST(EXTRACT(YEAR FROM ds) AS INTEGER), "
+        "CAST(EXTRACT(MONTH FROM ds) AS INTEGER), TRIM(COALESCE(category, ''))"
+    )
+
+
+def downgrade():
+    op.drop_table('monthly_category_total')
@@ -0,0 +1,41 @@
+"""Store adjusted_balance as a correction to the computed balance
+
+Revision ID: d7b2f5c9a184
+Revises: c2d8a4f1e693
+Create Date: 2026-10-18 21:04:17.512930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b2f5c9a184'
+down_revision = 'c2d8a4f1e693'
+branch_labels = None
+depends_on = None
+
+# Balance of a member as the group's expenses give it: own spend minus an equal share
+COMPUTED_BALANCE = """(
+    COALESCE((SELECT SUM(e.amount) FROM expense e
+              WHERE e.group_id = group_membership.group_id AND e.user_id = group_membership.user_id), 0)
+    - COALESCE((SELECT SUM(e.amount) FROM expense e WHERE e.group_id = group_membership.group_id), 0)
+      / (SELECT COUNT(*) FROM group_membership gm WHERE gm.group_id = group_membership.group_id)
+)"""
+
+
+def upgrade():
+    # Edited balances were stored as absolute values and 0.0 meant "never
+    # edited"; keep 0.0 as no correction and turn edits into the difference
+    op.execute("UPDATE group_membership SET adjusted_balance = 0.0 WHERE adjusted_balance IS NULL")
+    op.execute(
+        "UPDATE group_membership SET adjusted_balance = adjusted_balance - " + COMPUTED_BALANCE
+        + " WHERE adjusted_balance <> 0.0"
+    )
+
+
+def downgrade():
+    op.execute(
+        "UPDATE group_membership SET adjusted_balance = adjusted_balance + " + COMPUTED_BALANCE
+        + " WHERE adjusted_balance <> 0.0"
+    )
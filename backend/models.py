@@ -1,9 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
 db = SQLAlchemy()
 
+def dialect_insert():
+    """The INSERT construct with ON CONFLICT support for the session's database, or None."""
+    return {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(db.session.get_bind().dialect.name)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -30,6 +35,11 @@ class Expense(db.Model):
 
     user = db.relationship('User', backref=db.backref('expenses', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_expense_user_id_ds', 'user_id', 'ds'),
+        db.Index('ix_expense_group_id', 'group_id'),
+    )
+
 class Group(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
@@ -41,22 +51,38 @@ class GroupMembership(db.Model):
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
     role = db.Column(db.String(20), default="member")  # 'admin' or 'member'
 
-    # NEW: store manual balance adjustments
+    # Manual correction added to the balance computed from the group's expenses
     adjusted_balance = db.Column(db.Float, default=0.0)
 
     user = db.relationship("User", backref="group_memberships")
     group = db.relationship("Group", backref="memberships")
 
+    __table_args__ = (
+        db.UniqueConstraint('group_id', 'user_id', name='uq_group_membership_group_user'),
+        db.Index('ix_group_membership_user_id', 'user_id'),
+    )
+
 
 class ExpenseAudit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    expense_id = db.Column(db.Integer, db.ForeignKey('expense.id'), nullable=False)
+    # No foreign key: audit rows outlive the expenses they describe
+    expense_id = db.Column(db.Integer, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     action = db.Column(db.String(20))  # 'created', 'updated', 'deleted'
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Snapshot of the expense as of this action
+    group_id = db.Column(db.Integer)
+    amount = db.Column(db.Float)
+    description = db.Column(db.String(200))
+    expense_ds = db.Column(db.DateTime)
+
     user = db.relationship('User')
-    expense = db.relationship('Expense')
+
+    __table_args__ = (
+        db.Index('ix_expense_audit_expense_id', 'expense_id'),
+        db.Index('ix_expense_audit_group_id_timestamp', 'group_id', 'timestamp', 'id'),
+    )
 
 class Budget(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -68,6 +94,10 @@ class Budget(db.Model):
     
     user = db.relationship('User', backref=db.backref('budgets', lazy=True))
 
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'category', name='uq_budget_user_category'),
+    )
+
 class Rule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -76,4 +106,75 @@ class Rule(db.Model):
 
     user = db.relationship('User', backref=db.backref('rules', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_rule_user_id', 'user_id'),
+    )
+
     
+
+# Rollup of Expense per (user, month, category), kept in sync by rollup.py
+class MonthlyCategoryTotal(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    category = db.Column(db.String(100), nullable=False, default='')
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', 'category', name='uq_monthly_category_total'),
+    )
+
+# Outgoing mail, queued by the scheduler jobs and drained by outbox.deliver_pending
+class Outbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    dedup_key = db.Column(db.String(255), unique=True)  # e.g. 'budget:<email>:<date>'
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+# Forecast jobs, shared by every worker so any of them can answer a poll (see forecast.py)
+class ForecastResult(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # job id
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    fingerprint = db.Column(db.String(255), nullable=False)  # expense_fingerprint() of the fitted data
+    state = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'done', 'failed'
+    forecast = db.Column(db.Text)  # JSON records
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_forecast_result_user_id_fingerprint', 'user_id', 'fingerprint'),
+    )
+
+# Leader lease for the periodic jobs, see scheduler.py
+class SchedulerLease(db.Model):
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    heartbeat_at = db.Column(db.DateTime, nullable=False)
+
+# Chat turns, when the chatbot memory is DB-backed (CHAT_MEMORY_BACKEND=db)
+class ChatMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # 'user', 'assistant'
+    text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_chat_message_user_id_id', 'user_id', 'id'),
+        db.Index('ix_chat_message_created_at', 'created_at'),
+    )
@@ -0,0 +1,145 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+
+from models import db, dialect_insert, Outbox
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", 4))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", 30))
+CLAIM_LEASE = timedelta(minutes=5)  # a claimed row becomes deliverable again if its worker dies
+
+
+def enqueue(messages):
+    """Queue dicts of recipient/subject/body/dedup_key for delivery.
+
+    A message whose dedup_key is already in the outbox is dropped, so
+    rerunning a job the same day does not mail anyone twice. Returns the
+    number of messages actually queued.
+    """
+    messages = list(messages)
+    if not messages:
+        return 0
+
+    table = Outbox.__table__
+    now = datetime.utcnow()
+    rows = [dict(m, status="pending", attempts=0, next_attempt_at=now, created_at=now) for m in messages]
+    insert = dialect_insert()
+
+    if insert is not None:
+        stmt = insert(table).on_conflict_do_nothing(index_elements=["dedup_key"]).returning(table.c.id)
+        queued = len(db.session.execute(stmt, rows).all())
+    else:
+        keys = [r["dedup_key"] for r in rows if r.get("dedup_key")]
+        seen = {k for (k,) in db.session.query(Outbox.dedup_key).filter(Outbox.dedup_key.in_(keys))}
+        rows = [r for r in rows if r.get("dedup_key") not in seen]
+        if rows:
+            db.session.execute(table.insert(), rows)
+        queued = len(rows)
+
+    db.session.commit()
+    return queued
+
+
+def _claim_batch(limit):
+    """Lease up to `limit` due messages to this worker."""
+    now = datetime.utcnow()
+    batch = (
+        Outbox.query
+        .filter(Outbox.status == "pending", Outbox.next_attempt_at <= now)
+        .order_by(Outbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for row in batch:
+        row.attempts += 1
+        row.next_attempt_at = now + CLAIM_LEASE
+    db.session.commit()
+    return batch
+
+
+def _send_chunk(app, mail, chunk):
+    """Send (id, Message) pairs over one SMTP connection; returns {id: error or None}."""
+    results = {}
+    with app.app_context():
+        try:
+            with mail.connect() as conn:
+                for outbox_id, msg in chunk:
+                    try:
+                        conn.send(msg)
+                        results[outbox_id] = None
+                    except Exception as e:
+                        results[outbox_id] = str(e)
+        except Exception as e:
+            for outbox_id, _ in chunk:
+                results.setdefault(outbox_id, f"SMTP connection failed: {e}")
+    return results
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(60 * 2 ** (attempts - 1), 6 * 3600))
+
+
+def deliver_pending(app, mail, batch_size=OUTBOX_BATCH_SIZE, concurrency=OUTBOX_CONCURRENCY):
+    """Drain due outbox messages in batches, `concurrency` SMTP connections at a time.
+
+    Failed messages are retried with exponential backoff and marked
+    'failed' after OUTBOX_MAX_ATTEMPTS. Returns {'sent': n, 'failed': n, 'retrying': n}.
+    """
+    stats = {"sent": 0, "failed": 0, "retrying": 0}
+    sender = app.config["MAIL_USERNAME"]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            batch = _claim_batch(batch_size)
+            if not batch:
+                return stats
+
+            messages = [
+                (row.id, Message(subject=row.subject, sender=sender, recipients=[row.recipient], body=row.body))
+                for row in batch
+            ]
+            chunks = [messages[i::concurrency] for i in range(concurrency) if messages[i::concurrency]]
+            results = {}
+            for chunk_results in pool.map(lambda chunk: _send_chunk(app, mail, chunk), chunks):
+                results.update(chunk_results)
+
+            now = datetime.utcnow()
+            for row in batch:
+                error = results.get(row.id, "not attempted")
+                if error is None:
+                    row.status = "sent"
+                    row.sent_at = now
+                    row.last_error = None
+                    stats["sent"] += 1
+                elif row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    row.status = "failed"
+                    row.last_error = error
+                    stats["failed"] += 1
+                    logging.error("Giving up on mail %s to %s: %s", row.id, row.recipient, error)
+                else:
+                    row.next_attempt_at = now + _backoff(row.attempts)
+                    row.last_error = error
+                    stats["retrying"] += 1
+            db.session.commit()
+
+
+def prune_delivered(retention_days=OUTBOX_RETENTION_DAYS):
+    """Delete sent and failed messages older than retention_days; returns the count.
+
+    Pending rows are never touched. Keys of pruned rows become free again, which
+    is fine as long as retention is longer than any job's dedup window (a day).
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = (
+        Outbox.query
+        .filter(Outbox.status.in_(("sent", "failed")), Outbox.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    return deleted
@@ -0,0 +1,127 @@
+from sqlalchemy import extract, func
+
+from models import db, dialect_insert, Expense, MonthlyCategoryTotal
+
+
+def _bucket_category(category):
+    return (category or "").strip()
+
+
+def apply_expense_delta(user_id, year, month, category, amount, count):
+    """Add amount/count to one (user, month, category) bucket.
+
+    Runs in the caller's session, so the rollup commits or rolls back
+    together with the expense change that produced it.
+    """
+    values = dict(
+        user_id=user_id,
+        year=year,
+        month=month,
+        category=_bucket_category(category),
+        total=amount,
+        count=count,
+    )
+    table = MonthlyCategoryTotal.__table__
+    insert = dialect_insert()
+
+    if insert is not None:
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "year", "month", "category"],
+            set_={
+                "total": table.c.total + stmt.excluded.total,
+                "count": table.c.count + stmt.excluded.count,
+            },
+        )
+        db.session.execute(stmt)
+        return
+
+    bucket = (
+        MonthlyCategoryTotal.query
+        .filter_by(user_id=user_id, year=values["year"], month=values["month"], category=values["category"])
+        .with_for_update()
+        .first()
+    )
+    if bucket:
+        bucket.total += amount
+        bucket.count += count
+    else:
+        db.session.add(MonthlyCategoryTotal(**values))
+
+
+def record_expense(expense, sign=1):
+    """Count an expense in (sign=1) or out of (sign=-1) its month's bucket."""
+    apply_expense_delta(expense.user_id, expense.ds.year, expense.ds.month,
+                        expense.category, sign * expense.amount, sign)
+
+
+def record_expense_frame(user_id, df):
+    """Count a DataFrame of new expenses (ds, amount, category) in, one upsert per bucket."""
+    keys = [df["ds"].dt.year.rename("year"), df["ds"].dt.month.rename("month"), df["category"]]
+    buckets = df.groupby(keys)["amount"].agg(["sum", "count"])
+    for (year, month, category), row in buckets.iterrows():
+        apply_expense_delta(user_id, int(year), int(month), category, float(row["sum"]), int(row["count"]))
+
+
+def remove_expenses(*criteria):
+    """Take every expense matching criteria out of the rollup, before a bulk delete."""
+    year = extract("year", Expense.ds)
+    month = extract("month", Expense.ds)
+    rows = (
+        db.session.query(Expense.user_id, year, month, Expense.category,
+                         func.sum(Expense.amount), func.count(Expense.id))
+        .filter(*criteria)
+        .group_by(Expense.user_id, year, month, Expense.category)
+        .all()
+    )
+    for user_id, y, m, category, total, count in rows:
+        bucket = MonthlyCategoryTotal.query.filter_by(
+            user_id=user_id, year=int(y), month=int(m), category=_bucket_category(category)
+        ).first()
+        if bucket:
+            bucket.total -= total
+            bucket.count -= count
+
+
+def rebuild_rollup(user_id=None):
+    """Recompute the rollup from Expense, for one user or everyone."""
+    stale = MonthlyCategoryTotal.query
+    if user_id is not None:
+        stale = stale.filter_by(user_id=user_id)
+    stale.delete(synchronize_session=False)
+
+    year = extract("year", Expense.ds)
+    month = extract("month", Expense.ds)
+    category = func.trim(func.coalesce(Expense.category, ""))
+    source = db.session.query(Expense.user_id, year, month, category,
+                              func.sum(Expense.amount), func.count(Expense.id))
+    if user_id is not None:
+        source = source.filter(Expense.user_id == user_id)
+    source = source.group_by(Expense.user_id, year, month, category)
+
+    db.session.execute(
+        MonthlyCategoryTotal.__table__.insert().from_select(
+            ["user_id", "year", "month", "category", "total", "count"], source
+        )
+    )
+    db.session.commit()
+
+
+def category_totals(user_id, year, month):
+    """{category: total} for one month, straight from the rollup."""
+    rows = (
+        db.session.query(MonthlyCategoryTotal.category, MonthlyCategoryTotal.total)
+        .filter_by(user_id=user_id, year=year, month=month)
+        .filter(MonthlyCategoryTotal.count > 0)
+        .all()
+    )
+    return {category: float(total) for category, total in rows}
+
+
+def month_total(user_id, year, month):
+    total = (
+        db.session.query(func.sum(MonthlyCategoryTotal.total))
+        .filter_by(user_id=user_id, year=year, month=month)
+        .scalar()
+    )
+    return float(total or 0)
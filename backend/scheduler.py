@@ -0,0 +1,122 @@
+"""Periodic jobs, run by exactly one process per cluster.
+
+Every process that schedules jobs competes for a row in scheduler_lease.
+The holder renews it on a heartbeat, and jobs only run in the process
+holding an unexpired lease. If the leader dies, another process takes
+over once the lease expires.
+
+Modes (SCHEDULER_MODE):
+    embedded  each web worker runs the scheduler; the lease keeps the jobs single (default)
+    off       web workers run no jobs; start `python -m scheduler` separately
+"""
+import atexit
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, dialect_insert, SchedulerLease
+
+LEASE_TTL = int(os.getenv("SCHEDULER_LEASE_TTL", 60))
+
+
+class LeaderLease:
+    def __init__(self, app, name="scheduler", ttl=LEASE_TTL):
+        self.app = app
+        self.name = name
+        self.ttl = timedelta(seconds=ttl)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    def heartbeat(self):
+        """Take the lease if it is free or expired, renew it if already ours."""
+        with self.app.app_context():
+            try:
+                now = datetime.utcnow()
+                values = {"holder": self.holder, "expires_at": now + self.ttl, "heartbeat_at": now}
+                updated = (
+                    SchedulerLease.query
+                    .filter(SchedulerLease.name == self.name)
+                    .filter(or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now))
+                    .update(values, synchronize_session=False)
+                )
+                if not updated:
+                    self._insert(values)
+                db.session.commit()
+
+                lease = db.session.get(SchedulerLease, self.name)
+                leader = lease is not None and lease.holder == self.holder
+            except Exception as e:
+                db.session.rollback()
+                logging.error("Scheduler lease heartbeat failed: %s", e)
+                leader = False
+
+        if leader != self.is_leader:
+            logging.info("%s %s scheduler leadership", self.holder, "acquired" if leader else "lost")
+        self.is_leader = leader
+        return leader
+
+    def _insert(self, values):
+        insert = dialect_insert()
+        table = SchedulerLease.__table__
+        if insert is not None:
+            db.session.execute(
+                insert(table).values(name=self.name, **values).on_conflict_do_nothing(index_elements=["name"])
+            )
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(SchedulerLease(name=self.name, **values))
+        except IntegrityError:
+            pass  # another process created it first
+
+    def release(self):
+        if not self.is_leader:
+            return
+        with self.app.app_context():
+            SchedulerLease.query.filter_by(name=self.name, holder=self.holder).update(
+                {"expires_at": datetime.utcnow()}, synchronize_session=False
+            )
+            db.session.commit()
+        self.is_leader = False
+
+    def leader_only(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # Re-check right before running so a stale leader never runs a job
+            if not self.heartbeat():
+                return None
+            return func(*args, **kwargs)
+        return wrapper
+
+
+def build_scheduler(app, jobs, scheduler_class=BackgroundScheduler):
+    """A scheduler running `jobs` [(func, trigger kwargs)] only while holding the lease."""
+    lease = LeaderLease(app)
+    scheduler = scheduler_class()
+    scheduler.add_job(func=lease.heartbeat, trigger="interval", seconds=max(lease.ttl.seconds // 3, 1),
+                      next_run_time=datetime.now(), id="scheduler-lease-heartbeat")
+    for func, trigger in jobs:
+        scheduler.add_job(func=lease.leader_only(func), max_instances=1, coalesce=True, **trigger)
+    atexit.register(lease.release)
+    return scheduler
+
+
+def main():
+    # Importing the app must not start the embedded scheduler as well
+    os.environ["SCHEDULER_MODE"] = "off"
+    from app import app, SCHEDULED_JOBS
+
+    logging.info("Starting standalone scheduler")
+    build_scheduler(app, SCHEDULED_JOBS, BlockingScheduler).start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import heapq
+import os
+
+from sqlalchemy import func
+
+from cache import LRUCache
+from models import db, Expense, GroupMembership, User
+
+# invalidate_group only reaches this worker; the TTL bounds how long another
+# worker serves balances from before an expense or settlement made elsewhere
+SETTLEMENTS_CACHE_TTL = int(os.getenv("SETTLEMENTS_CACHE_TTL", 30))
+_group_cache = LRUCache(maxsize=1024, ttl=SETTLEMENTS_CACHE_TTL)
+
+
+def _compute_balances(group_id):
+    """Per-member spending and balances of a group in a single query."""
+    spent = (
+        db.session.query(Expense.user_id, func.sum(Expense.amount).label("spent"))
+        .filter(Expense.group_id == group_id)
+        .group_by(Expense.user_id)
+        .subquery()
+    )
+    total = (
+        db.session.query(func.coalesce(func.sum(Expense.amount), 0))
+        .filter(Expense.group_id == group_id)
+        .scalar_subquery()
+    )
+    count = db.session.query(func.count(Expense.id)).filter(Expense.group_id == group_id).scalar_subquery()
+
+    rows = (
+        db.session.query(
+            GroupMembership.user_id,
+            User.username,
+            GroupMembership.adjusted_balance,
+            func.coalesce(spent.c.spent, 0),
+            total,
+            count,
+        )
+        .join(User, User.id == GroupMembership.user_id)
+        .outerjoin(spent, spent.c.user_id == GroupMembership.user_id)
+        .filter(GroupMembership.group_id == group_id)
+        .order_by(GroupMembership.id)
+        .all()
+    )
+
+    expense_count = rows[0][5] if rows else 0
+    total_spent = float(rows[0][4]) if rows else 0.0
+    share_per_user = total_spent / len(rows) if rows else 0
+
+    members = []
+    for user_id, username, adjustment, user_spent, _, _ in rows:
+        # adjusted_balance is a manual correction on top of what the expenses say,
+        # so balances keep following new expenses after an edit
+        adjustment = adjustment or 0.0
+        balance = round(float(user_spent) - share_per_user + adjustment, 2)
+        members.append({
+            "user_id": user_id,
+            "username": username,
+            "spent": round(share_per_user, 2) + balance,  # adjusted, not raw spend
+            "should_have_spent": round(share_per_user, 2),
+            "balance": balance,  # + means overpaid, - means underpaid
+            "adjustment": adjustment
+        })
+
+    return {
+        "expense_count": expense_count,
+        "total_spent": total_spent,
+        "members": members,
+        "settlements": simplify_debts(members)
+    }
+
+
+def simplify_debts(members):
+    """Minimal list of transfers that settles every member's balance.
+
+    Greedy min-cash-flow: repeatedly match the largest debtor with the
+    largest creditor, so each step clears at least one of them.
+    """
+    creditors = [(-m["balance"], m["username"]) for m in members if m["balance"] > 0.005]
+    debtors = [(m["balance"], m["username"]) for m in members if m["balance"] < -0.005]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append({"from": debtor, "to": creditor, "amount": round(amount, 2)})
+
+        if -credit - amount > 0.005:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt - amount > 0.005:
+            heapq.heappush(debtors, (debt + amount, debtor))
+
+    return transfers
+
+
+def group_balances(group_id):
+    """Cached balances and settlements of a group, recomputed after invalidate_group."""
+    result = _group_cache.get(group_id)
+    if result is None:
+        result = _compute_balances(group_id)
+        _group_cache.set(group_id, result)
+    return result
+
+
+def invalidate_group(group_id):
+    if group_id is not None:
+        _group_cache.pop(group_id)
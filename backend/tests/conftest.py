@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file.name}"
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+os.environ["SCHEDULER_MODE"] = "off"
+os.environ["WARM_UP"] = "off"
+os.environ["LLM_CACHE_PATH"] = ""
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import app as flask_app
+from models import db, User
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user; returns (user, Authorization headers)."""
+    def make(username):
+        user = User(username=username, password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=username, additional_claims={"uid": user.id})
+        return user, {"Authorization": f"Bearer {token}"}
+    return make
+
+
+def pytest_sessionfinish(session, exitstatus):
+    os.unlink(_db_file.name)
@@ -0,0 +1,55 @@
+from chatbot.chatbot import FinanceChatBot
+from chatbot.memory import MemoryStore
+from chatbot.prompt_builder import PromptBuilder
+from chatbot.response_cache import ResponseCache
+
+
+class FakeLLM:
+    model = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_reply(self, prompt):
+        self.calls += 1
+        return f"reply {self.calls}"
+
+
+class FakeStorage:
+    def get_expense_context(self, user_id):
+        return {"summary": "No spending recorded this month or last month."}
+
+
+class NoSpendingQueries:
+    def match(self, user_input, user_id):
+        return None
+
+
+def make_bot():
+    bot = FinanceChatBot.__new__(FinanceChatBot)
+    bot.llm = FakeLLM()
+    bot.memory = MemoryStore()
+    bot.storage = FakeStorage()
+    bot.query_engine = NoSpendingQueries()
+    bot.response_cache = ResponseCache(path="")
+    bot.prompt_builder = PromptBuilder()
+    return bot
+
+
+def test_repeated_question_in_one_conversation_hits_the_cache():
+    bot = make_bot()
+    replies = [bot.chat("How can I save more money?", 1) for _ in range(4)]
+
+    assert replies == ["reply 1"] * 4
+    assert bot.llm.calls == 1
+    assert bot.response_cache.stats()["hits"] == 3
+
+
+def test_follow_up_is_keyed_on_the_exchange_it_follows():
+    bot = make_bot()
+    bot.chat("How can I save on food?", 1)
+    bot.chat("And what about transport?", 1)
+    bot.chat("How can I save on rent?", 1)
+    bot.chat("And what about transport?", 1)
+
+    assert bot.llm.calls == 4
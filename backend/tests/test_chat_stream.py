@@ -0,0 +1,61 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import app as backend_app
+from benchmarks.fake_ollama import FakeOllama
+from chatbot.chatbot import FinanceChatBot
+from chatbot.gateway import LLMGateway
+from chatbot.llm_interface import LLMInterface
+
+
+@pytest.fixture
+def bot(app, monkeypatch):
+    """The real chatbot, talking to a local fake Ollama."""
+    with FakeOllama(tokens=5, token_delay=0, first_token_delay=0) as fake:
+        chatbot = FinanceChatBot()
+        chatbot.llm = LLMGateway(LLMInterface(host=fake.url))
+        monkeypatch.setattr(backend_app, "finance_bot", SimpleNamespace(get=lambda: chatbot))
+        yield chatbot
+
+
+def parse_events(body):
+    """[(event name or None, data)] from a text/event-stream body."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        name, data = None, None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                name = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((name, data))
+    return events
+
+
+def test_chat_stream_sends_tokens_then_done_and_saves_the_reply(client, make_user, bot):
+    user, headers = make_user("streamer")
+
+    response = client.post("/chat/stream", headers=headers, json={"message": "hello there"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = parse_events(response.get_data(as_text=True))
+    tokens = [data["token"] for name, data in events[:-1]]
+    assert [name for name, _ in events[:-1]] == [None] * 5
+    assert tokens == [f"tok{i} " for i in range(5)]
+    assert events[-1] == ("done", {"reply": "tok0 tok1 tok2 tok3 tok4"})
+
+    assert bot.memory.get_messages(user.id) == [
+        {"role": "user", "text": "hello there"},
+        {"role": "assistant", "text": "tok0 tok1 tok2 tok3 tok4"},
+    ]
+
+
+def test_chat_stream_rejects_an_empty_message(client, make_user, bot):
+    _, headers = make_user("streamer")
+
+    response = client.post("/chat/stream", headers=headers, json={"message": ""})
+
+    assert response.status_code == 400
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from models import db, Expense, ExpenseAudit, Group, GroupMembership
+
+
+def test_expenses_end_date_includes_the_whole_day(client, make_user):
+    user, headers = make_user("spender")
+    for ds in ["2024-05-30T09:00:00", "2024-05-31T00:00:00", "2024-05-31T18:45:00", "2024-06-01T00:00:00"]:
+        db.session.add(Expense(user_id=user.id, ds=datetime.fromisoformat(ds), amount=10.0, category="Food"))
+    db.session.commit()
+
+    rows = client.get("/historical?start=2024-05-30&end=2024-05-31", headers=headers).get_json()["historical"]
+
+    assert [row["ds"] for row in rows] == ["2024-05-30T09:00:00", "2024-05-31T00:00:00", "2024-05-31T18:45:00"]
+
+
+def test_expenses_end_with_a_time_is_inclusive(client, make_user):
+    user, headers = make_user("spender")
+    for ds in ["2024-05-31T12:00:00", "2024-05-31T12:00:01"]:
+        db.session.add(Expense(user_id=user.id, ds=datetime.fromisoformat(ds), amount=10.0, category="Food"))
+    db.session.commit()
+
+    rows = client.get("/historical?end=2024-05-31T12:00:00", headers=headers).get_json()["historical"]
+
+    assert [row["ds"] for row in rows] == ["2024-05-31T12:00:00"]
+
+
+def test_audit_log_end_date_includes_entries_later_that_day(client, make_user):
+    user, headers = make_user("auditor")
+    group = Group(name="flat", created_by=user.id)
+    db.session.add(group)
+    db.session.flush()
+    db.session.add(GroupMembership(user_id=user.id, group_id=group.id))
+    for action, timestamp in [("created", "2024-05-31T18:30:00"), ("updated", "2024-06-01T08:00:00")]:
+        db.session.add(ExpenseAudit(expense_id=1, user_id=user.id, group_id=group.id, action=action,
+                                    timestamp=datetime.fromisoformat(timestamp), amount=10.0))
+    db.session.commit()
+
+    data = client.get(f"/api/group/{group.id}/audit-log?end=2024-05-31", headers=headers).get_json()
+
+    assert [entry["action"] for entry in data["entries"]] == ["created"]
@@ -0,0 +1,32 @@
+from models import Expense
+
+CSV = """ds,amount,category,description,is_recurring,recurring_interval
+2024-05-01,1200,Rent,rent,1,monthly
+2024-05-02,40,Food,lunch,,
+2024-05-03,15,Transport,bus,0,
+2024-05-04,9.99,Entertainment,music,yes,monthly
+"""
+
+
+def test_import_reads_is_recurring_from_a_column_with_blanks(client, make_user):
+    user, headers = make_user("importer")
+
+    response = client.post("/expenses/import", headers={**headers, "Content-Type": "text/csv"}, data=CSV)
+
+    assert response.get_json() == {"status": "success", "imported": 4}
+    recurring = {e.description: e.is_recurring for e in Expense.query.filter_by(user_id=user.id)}
+    assert recurring == {"rent": True, "lunch": False, "bus": False, "music": True}
+
+
+def test_import_accepts_json_booleans(client, make_user):
+    user, headers = make_user("importer")
+    rows = [
+        {"ds": "2024-05-01", "amount": 1200, "category": "Rent", "description": "rent", "is_recurring": True},
+        {"ds": "2024-05-02", "amount": 40, "category": "Food", "description": "lunch", "is_recurring": False},
+    ]
+
+    response = client.post("/expenses/import", headers=headers, json=rows)
+
+    assert response.get_json() == {"status": "success", "imported": 2}
+    recurring = {e.description: e.is_recurring for e in Expense.query.filter_by(user_id=user.id)}
+    assert recurring == {"rent": True, "lunch": False}
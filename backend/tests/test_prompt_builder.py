@@ -0,0 +1,32 @@
+import pytest
+
+from chatbot.prompt_builder import PromptBuilder, estimate_tokens
+
+HISTORY = [{"role": "user", "text": "how do I budget?"}, {"role": "assistant", "text": "Start with your fixed costs."}]
+SUMMARY = "Month to date: ₹1,200 (all of last month: ₹3,400)\n- food: ₹800 vs ₹900 (-11%)"
+
+
+@pytest.mark.parametrize("budget", [100, 300, 1500])
+def test_prompt_never_exceeds_the_budget(budget):
+    builder = PromptBuilder(budget=budget)
+    prompt, tokens = builder.build("why " * 5000, HISTORY, SUMMARY)
+
+    assert tokens["total"] <= budget
+    assert estimate_tokens(prompt) <= budget
+    assert tokens["question"] > 0
+
+
+def test_memory_and_summary_give_way_before_the_question():
+    builder = PromptBuilder(budget=400)
+    question = "how can I spend less on food " * 20  # about 150 tokens
+    prompt, tokens = builder.build(question, HISTORY * 20, SUMMARY)
+
+    assert question in prompt
+    assert tokens["total"] <= 400
+
+
+def test_stats_expose_the_last_prompt():
+    builder = PromptBuilder()
+    _, tokens = builder.build("hi", HISTORY, SUMMARY)
+
+    assert builder.stats()["last"] == tokens
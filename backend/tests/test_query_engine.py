@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+from chatbot.query_engine import DEFAULT_CATEGORIES, QueryEngine, parse_compared_periods
+
+TODAY = date(2026, 5, 14)
+
+
+class Engine(QueryEngine):
+    """QueryEngine with the default categories, so parsing needs no database."""
+
+    def __init__(self):
+        pass
+
+    def user_categories(self, user_id):
+        return DEFAULT_CATEGORIES
+
+
+@pytest.mark.parametrize("question", [
+    "how much did I spend last month",
+    "spent on food this month vs last month",
+    "compare food and transport last month",
+    "how much food last month",
+    "top 3 categories this year",
+    "what were my expenses in march",
+])
+def test_spending_questions_are_routed_to_the_database(question):
+    assert Engine().match(question, 1) is not None
+
+
+@pytest.mark.parametrize("question", [
+    "how much should i save each month",
+    "what is the cost of living in india",
+    "how much does a car cost",
+    "what is a budget",
+    "can I afford a new phone if I spend less on food",
+    "give me tips to cut my costs",
+])
+def test_general_questions_are_left_to_the_llm(question):
+    assert Engine().match(question, 1) is None
+
+
+def test_two_periods_are_compared():
+    first, second = parse_compared_periods("spent on food this month vs last month", TODAY)
+
+    assert first == (date(2026, 5, 1), date(2026, 5, 15), "this month")
+    assert second == (date(2026, 4, 1), date(2026, 5, 1), "last month")
+    assert parse_compared_periods("compare food vs transport this month", TODAY) is None
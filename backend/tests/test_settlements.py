@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from models import db, Expense, Group, GroupMembership
+from settlements import invalidate_group
+
+
+def make_group(make_user, spends):
+    """A group whose members spent the given amounts; returns (group id, headers of the first member)."""
+    members = [make_user(f"member{i}") for i in range(len(spends))]
+    group = Group(name="trip", created_by=members[0][0].id)
+    db.session.add(group)
+    db.session.flush()
+    for (user, _), amount in zip(members, spends):
+        db.session.add(GroupMembership(user_id=user.id, group_id=group.id))
+        if amount:
+            db.session.add(Expense(user_id=user.id, group_id=group.id, ds=datetime.utcnow(),
+                                   amount=amount, category="Food"))
+    db.session.commit()
+    return group.id, members[0][1]
+
+
+def test_unequal_spends_produce_settlements(client, make_user):
+    group_id, headers = make_group(make_user, [90.0, 30.0, 0.0])
+
+    data = client.get(f"/api/group/{group_id}/settlements", headers=headers).get_json()
+
+    balances = {b["username"]: b["balance"] for b in data["balances"]}
+    assert balances == {"member0": 50.0, "member1": -10.0, "member2": -40.0}
+    assert sorted((s["from"], s["to"], s["amount"]) for s in data["settlements"]) == [
+        ("member1", "member0", 10.0),
+        ("member2", "member0", 40.0),
+    ]
+
+
+def test_edited_balance_still_follows_new_expenses(client, make_user):
+    group_id, headers = make_group(make_user, [90.0, 30.0, 0.0])
+    client.put(f"/api/group/{group_id}/split-summary", headers=headers,
+               json={"summary": [{"username": "member0", "balance": 30.0}]})
+
+    member1 = GroupMembership.query.filter_by(group_id=group_id).order_by(GroupMembership.id).all()[1]
+    db.session.add(Expense(user_id=member1.user_id, group_id=group_id, ds=datetime.utcnow(),
+                           amount=30.0, category="Food"))
+    db.session.commit()
+    invalidate_group(group_id)
+
+    data = client.get(f"/api/group/{group_id}/settlements", headers=headers).get_json()
+    balances = {b["username"]: b["balance"] for b in data["balances"]}
+    # Share is now 50: member0 is 90 - 50 with the -20 correction kept
+    assert balances["member0"] == 20.0
+    assert balances["member1"] == 10.0
@@ -1,30 +1,27 @@
-import pandas as pd
-import joblib
-from prophet import Prophet
 import os
 from flask_jwt_extended import get_jwt_identity
+from forecast import daily_frame
 
 # Load the trained Prophet model (change filename as needed)
 def load_model(model_path='model/model.pkl'):
+    import joblib
     with open(model_path, 'rb') as f:
         model = joblib.load(f)
     return model
 
-def make_forecast(model, df, periods=30):
-    df_prophet = df[["ds", "amount"]].rename(columns={"ds": "ds", "amount": "y"})
-    model.fit(df_prophet)
-    future = model.make_future_dataframe(periods=periods)
-    forecast = model.predict(future)
-    return forecast[["ds", "yhat"]]
 
 # Load the tf-idf vectorizer (change filename as needed)
 def load_vectorizer(vectorizer_path='model/vectorizer.pkl'):
+    import joblib
     with open(vectorizer_path, 'rb') as f:
         vectorizer = joblib.load(f)
     return vectorizer
 
-# Make future predictions
-def make_forecast(model, periods=30):
+# Make future predictions, fitting first on one row per day when data is given
+def make_forecast(model, df=None, periods=30):
+    if df is not None:
+        df_prophet = daily_frame(df[["ds", "amount"]].rename(columns={"amount": "y"}))
+        model.fit(df_prophet)
     future = model.make_future_dataframe(periods=periods)
     forecast = model.predict(future)
     return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
@@ -35,6 +32,7 @@ def forecast_to_dict(forecast_df):
 
 # Optional: Load data if you want to expose historical data
 def load_data():
+    import pandas as pd
     user = get_jwt_identity()
     filepath = f"data/{user}_expenses.csv"
     if not os.path.exists(filepath):
@@ -52,6 +50,7 @@ def filter_data_by_category(df, category):
 # Function to calculate the total spent in a given month
 def calculate_total_spent(df, month):
     # Ensure 'ds' is a datetime column
+    import pandas as pd
     df['ds'] = pd.to_datetime(df['ds'])
     # Filter the DataFrame for the given month
     monthly_data = df[df['ds'].dt.month == month]
@@ -68,24 +67,34 @@ def budget_alert(monthly_budget, total_spent):
 from models import ExpenseAudit, db
 from datetime import datetime
 
-def log_expense_action(expense_id, user_id, action):
-    audit = ExpenseAudit(
-        expense_id=expense_id,
+def log_expense_action(expense, user_id, action):
+    """Stage an audit row for expense in the current transaction; the caller commits.
+
+    The row keeps a snapshot of the expense, so it survives a delete.
+    """
+    if expense.id is None:
+        db.session.flush()
+    db.session.add(ExpenseAudit(
+        expense_id=expense.id,
         user_id=user_id,
         action=action,
-        timestamp=datetime.utcnow()
-    )
-    db.session.add(audit)
-    db.session.commit()
+        timestamp=datetime.utcnow(),
+        group_id=expense.group_id,
+        amount=expense.amount,
+        description=expense.description,
+        expense_ds=expense.ds
+    ))
 
-from datetime import datetime
-from models import Expense, Budget, db, Rule
+from datetime import datetime, timedelta
+import re
+from sqlalchemy import and_, extract, func, or_
+from cache import LRUCache
+from models import Expense, Budget, db, Rule, User, MonthlyCategoryTotal
+from rollup import month_total
 
 def check_overspending(user_id):
     today = datetime.today()
-    month_start = datetime(today.year, today.month, 1) 
-    expenses = Expense.query.filter( Expense.user_id == user_id, Expense.ds >= month_start ).all() 
-    total_spent = sum(e.amount for e in expenses) 
+    total_spent = month_total(user_id, today.year, today.month)
     budget = Budget.query.filter_by(user_id=user_id, category="Monthly").first() 
     if not budget: 
         return None # no budget set
@@ -103,23 +112,185 @@ def check_overspending(user_id):
         
     return alerts
 
+def over_budget_users(year, month):
+    """Users with an email whose spend for the month exceeds their monthly budget.
+
+    One grouped query over users, budgets and the monthly rollup; rows are
+    streamed as (username, email, limit, spent).
+    """
+    spent = (
+        db.session.query(
+            MonthlyCategoryTotal.user_id,
+            func.sum(MonthlyCategoryTotal.total).label("spent")
+        )
+        .filter(MonthlyCategoryTotal.year == year, MonthlyCategoryTotal.month == month)
+        .group_by(MonthlyCategoryTotal.user_id)
+        .subquery()
+    )
+    return (
+        db.session.query(User.username, User.email, Budget.limit, spent.c.spent)
+        .join(Budget, and_(Budget.user_id == User.id, Budget.category == "Monthly"))
+        .join(spent, spent.c.user_id == User.id)
+        .filter(User.email.isnot(None), User.email != "", spent.c.spent > Budget.limit)
+        .yield_per(500)
+    )
+
+def due_today_filter(today):
+    """SQL condition for recurring expenses that fall due on `today`.
+
+    Monthly ones match on day of month, weekly ones on weekday (SQL's dow
+    counts from Sunday = 0, Python's weekday() from Monday = 0).
+    """
+    return and_(
+        Expense.is_recurring.is_(True),
+        or_(
+            and_(Expense.recurring_interval == "monthly", extract("day", Expense.ds) == today.day),
+            and_(Expense.recurring_interval == "weekly", extract("dow", Expense.ds) == (today.weekday() + 1) % 7),
+        )
+    )
+
+def due_recurring_expenses(today):
+    """(expense_id, username, email, description, amount, interval) for every reminder due today."""
+    return (
+        db.session.query(Expense.id, User.username, User.email, Expense.description,
+                         Expense.amount, Expense.recurring_interval)
+        .join(User, User.id == Expense.user_id)
+        .filter(due_today_filter(today), User.email.isnot(None), User.email != "")
+        .order_by(User.id, Expense.id)
+        .yield_per(500)
+    )
+
 def check_recurring_reminders(user_id):
     today = datetime.today().date()
-    recurring_expenses = Expense.query.filter_by(user_id=user_id, is_recurring=True).all()
-    
-    reminders = [] 
-    
-    for exp in recurring_expenses:
-        if exp.recurring_interval == "monthly" and exp.ds.day == today.day:
-            reminders.append(f"🔔 Reminder: {exp.description} ({exp.amount}) is due today.")
-        if exp.recurring_interval == "weekly" and exp.ds.weekday() == today.weekday():
-            reminders.append(f"🔔 Weekly reminder: {exp.description} ({exp.amount}) is due today.")
-    
+    due = (
+        db.session.query(Expense.description, Expense.amount, Expense.recurring_interval)
+        .filter(Expense.user_id == user_id, due_today_filter(today))
+        .all()
+    )
+
+    reminders = []
+
+    for description, amount, interval in due:
+        if interval == "monthly":
+            reminders.append(f"🔔 Reminder: {description} ({amount}) is due today.")
+        else:
+            reminders.append(f"🔔 Weekly reminder: {description} ({amount}) is due today.")
+
     return reminders
 
+class RuleMatcher:
+    """All of a user's keyword rules compiled into a single regex.
+
+    The keywords are alternated in rule order inside a lookahead, so the
+    scan tries every position and the rule created first wins on ties,
+    the same precedence as checking the rules one by one.
+    """
+
+    def __init__(self, rules):
+        self._rules = {}
+        for priority, (keyword, category) in enumerate(rules):
+            keyword = keyword.lower()
+            if keyword and keyword not in self._rules:
+                self._rules[keyword] = (priority, category)
+
+        self._pattern = None
+        if self._rules:
+            alternation = "|".join(re.escape(k) for k in self._rules)
+            self._pattern = re.compile(f"(?=({alternation}))")
+
+    def match(self, description):
+        if self._pattern is None or not description:
+            return None
+        best = None
+        for m in self._pattern.finditer(description.lower()):
+            rule = self._rules[m.group(1)]
+            if best is None or rule[0] < best[0]:
+                best = rule
+                if best[0] == 0:
+                    break
+        return best[1] if best else None
+
+
+# invalidate_rules only reaches this worker; the TTL bounds how long
+# another worker keeps matching against rules that were edited elsewhere
+RULES_CACHE_TTL = int(os.getenv("RULES_CACHE_TTL", 60))
+_rule_matchers = LRUCache(maxsize=1024, ttl=RULES_CACHE_TTL)
+
+def get_rule_matcher(user_id):
+    matcher = _rule_matchers.get(user_id)
+    if matcher is None:
+        rules = (
+            db.session.query(Rule.keyword, Rule.category)
+            .filter_by(user_id=user_id)
+            .order_by(Rule.id)
+            .all()
+        )
+        matcher = RuleMatcher(rules)
+        _rule_matchers.set(user_id, matcher)
+    return matcher
+
+def invalidate_rules(user_id):
+    _rule_matchers.pop(user_id)
+
 def apply_rules(user_id, description):
-    rules = Rule.query.filter_by(user_id=user_id).all()
-    for rule in rules:
-        if rule.keyword.lower() in description.lower():
-            return rule.category  # since it's just a string
-    return None
+    return get_rule_matcher(user_id).match(description)
+
+def apply_rules_batch(user_id, descriptions):
+    """Same as apply_rules for many descriptions."""
+    matcher = get_rule_matcher(user_id)
+    return [matcher.match(description) for description in descriptions]
+
+
+# --- Keyset pagination over a user's expenses, ordered by (ds, id) ---
+EXPENSE_COLUMNS = (
+    Expense.id, Expense.ds, Expense.amount, Expense.category,
+    Expense.description, Expense.is_recurring, Expense.recurring_interval
+)
+
+def encode_cursor(ds, expense_id):
+    return f"{ds.isoformat()}_{expense_id}"
+
+def decode_cursor(cursor):
+    """Raises ValueError for a malformed cursor."""
+    ds, expense_id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(ds), int(expense_id)
+
+def until(column, end):
+    """column <= end; a date end (no time of day given) takes in that whole day."""
+    if isinstance(end, datetime):
+        return column <= end
+    return column < datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+def expense_page_query(user_id, after=None, start=None, end=None):
+    """Column-projected expenses of a user, optionally after a cursor and within [start, end]."""
+    query = db.session.query(*EXPENSE_COLUMNS).filter(Expense.user_id == user_id)
+    if start:
+        query = query.filter(Expense.ds >= start)
+    if end:
+        query = query.filter(until(Expense.ds, end))
+    if after:
+        ds, expense_id = decode_cursor(after)
+        query = query.filter(or_(
+            Expense.ds > ds,
+            and_(Expense.ds == ds, Expense.id > expense_id)
+        ))
+    return query.order_by(Expense.ds, Expense.id)
+
+def audit_log_query(group_id, after=None, start=None, end=None):
+    """Audit entries of a group, newest first, optionally before a cursor and within [start, end]."""
+    query = (
+        db.session.query(ExpenseAudit, User.username)
+        .join(User, ExpenseAudit.user_id == User.id)
+        .filter(ExpenseAudit.group_id == group_id)
+    )
+    if start:
+        query = query.filter(ExpenseAudit.timestamp >= start)
+    if end:
+        query = query.filter(until(ExpenseAudit.timestamp, end))
+    if after:
+        timestamp, audit_id = decode_cursor(after)
+        query = query.filter(or_(
+            ExpenseAudit.timestamp < timestamp,
+            and_(ExpenseAudit.timestamp == timestamp, ExpenseAudit.id < audit_id)
+        ))
+    return query.order_by(ExpenseAudit.timestamp.desc(), ExpenseAudit.id.desc())
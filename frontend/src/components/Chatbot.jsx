@@ -1,6 +1,6 @@
 import React, { useState, useRef, useEffect } from "react";
 import { MessageSquare, X, Send } from "lucide-react";
-import { getBotReply } from "../services/api";
+import { streamBotReply } from "../services/api";
 
 const Chatbot = ({ theme }) => {
   const [isOpen, setIsOpen] = useState(false);
@@ -9,6 +9,7 @@ const Chatbot = ({ theme }) => {
   ]);
   const [input, setInput] = useState("");
   const [isAILoading, setIsAILoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const messagesEndRef = useRef(null);
 
   const isGradient = theme === "gradient";
@@ -28,9 +29,20 @@ const Chatbot = ({ theme }) => {
     setIsAILoading(true);
 
     try {
-        const botReply = await getBotReply(userMessageText);
-        const botMessage = { sender: "bot", text: botReply };
-        setMessages((prev) => [...prev, botMessage]);
+        // Add the bot bubble on the first token and grow it as the rest arrive
+        let started = false;
+        await streamBotReply(userMessageText, (token) => {
+          if (!started) {
+            started = true;
+            setIsStreaming(true);
+            setMessages((prev) => [...prev, { sender: "bot", text: token }]);
+            return;
+          }
+          setMessages((prev) => {
+            const last = prev[prev.length - 1];
+            return [...prev.slice(0, -1), { ...last, text: last.text + token }];
+          });
+        });
     } catch (err) {
       console.error(err);
       setMessages((prev) => [
@@ -39,6 +51,7 @@ const Chatbot = ({ theme }) => {
       ]);
     } finally {
         setIsAILoading(false);
+        setIsStreaming(false);
     }
   };
 
@@ -96,7 +109,7 @@ const Chatbot = ({ theme }) => {
             ))}
             
             {/* Loading indicator for AI reply */}
-            {isAILoading && (
+            {isAILoading && !isStreaming && (
                 <div className="flex justify-start">
                     <div className={`${botBubbleColor} px-3 py-2 rounded-xl rounded-bl-none shadow-md`}>
                         <div className="flex space-x-1">
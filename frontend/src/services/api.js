@@ -58,16 +58,25 @@ export const registerUser = async (credentials) => {
   return json;
 };
 
-// 📈 Forecast
+// 📈 Forecast (queued on the server, long-polled until the fit is done)
 export const fetchForecast = async () => {
-  const res = await fetchWithRefresh(`${API_BASE}/predict`, {
+  const res = await fetchWithRefresh(`${API_BASE}/predict/jobs`, {
+    method: "POST",
     headers: getAuthHeaders(),
   });
-  if (!res.ok) {
-    const err = await res.json();
-    throw new Error(err.detail || "Failed to fetch forecast data");
+  let json = await res.json();
+  if (!res.ok) throw new Error(json.message || "Failed to fetch forecast data");
+
+  // Plain polls: each one returns at once instead of holding a server thread
+  while (json.state !== "done") {
+    if (json.state === "failed") throw new Error(json.message || "Forecast failed");
+    await new Promise((resolve) => setTimeout(resolve, 2000));
+    const poll = await fetchWithRefresh(`${API_BASE}/predict/jobs/${json.job_id}`, {
+      headers: getAuthHeaders(),
+    });
+    json = await poll.json();
+    if (!poll.ok) throw new Error(json.message || "Failed to fetch forecast data");
   }
-  const json = await res.json();
   return json.forecast;
 };
 
@@ -264,8 +273,10 @@ export const getCurrentUser = async () => {
   return res.json().then((data) => data.user);
 };
 
-export const fetchAuditLog = async (groupId) => {
-  const res = await fetchWithRefresh(`${API_BASE}/api/group/${groupId}/audit-log`, {
+export const fetchAuditLog = async (groupId, { limit = 100, after } = {}) => {
+  const params = new URLSearchParams({ limit });
+  if (after) params.set("after", after);
+  const res = await fetchWithRefresh(`${API_BASE}/api/group/${groupId}/audit-log?${params}`, {
     method: "GET",
     headers: getAuthHeaders(),
   });
@@ -275,7 +286,7 @@ export const fetchAuditLog = async (groupId) => {
     throw new Error(err.message || "Failed to fetch Audit log");
   }
 
-  return res.json();
+  return res.json().then((data) => data.entries);
 };
 
 export const fetchGroupSpendingSplit = async (groupId) => {
@@ -438,3 +449,45 @@ export const getBotReply = async (message) => {
   });
   return res.json().then((json) => json.reply);
 };
+
+// Streams the reply over SSE, calling onToken for each chunk; resolves to the full reply
+export const streamBotReply = async (message, onToken) => {
+  const res = await fetch(`${API_BASE}/chat/stream`, {
+    method: "POST",
+    headers: getAuthHeaders(),
+    body: JSON.stringify({ message }),
+  });
+  if (!res.ok || !res.body) {
+    throw new Error("Failed to stream chat reply");
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let reply = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      const event = raw.match(/^event: (.*)$/m)?.[1] || "message";
+      const data = raw.match(/^data: (.*)$/m)?.[1];
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === "done") {
+        reply = payload.reply;
+      } else {
+        reply += payload.token;
+        onToken(payload.token);
+      }
+    }
+  }
+  return reply;
+};